@@ -1,22 +1,37 @@
 import sys
+from typing import Dict, Tuple
 from graphui import *
+from graphcanvas import GraphCanvas
 from state import *
 from graphutils import Graph, Vertex
+from graphworker import AlgorithmRunner, AlgorithmProgress, AlgorithmPlayer
+import graphio
 
 
 class GraphMainWindow(QtWidgets.QMainWindow):
-	def __init__(self, graph: Graph):
+	# renderer is "widgets" for a widget per grid cell or "canvas" for a single GraphCanvas, which suits large grids
+	def __init__(self, graph: Graph, positions: Dict[Vertex, Tuple[int, int]] = None, renderer: str = "widgets",
+				 grid_size: Tuple[int, int] = (30, 30)):
 		super().__init__()
 		self._state = None
 		self._source = None
 		self._destination = None
+		# Background run of the algorithm, created by dijkstra_init, and its playback
+		self._runner = None
+		self._player = None
+		self._speed = 100
 
 		self._toolbar = QtWidgets.QToolBar()
 		label = QtWidgets.QLabel("Dijkstra algorithm visualizer. Select starting and ending vertices \n"
 								 + "and click Step to run the algorithm. ")
 
 		self._graph = graph
-		self._graph_widget = GraphWidget(graph=graph)
+		if renderer == "canvas":
+			self._graph_widget = GraphCanvas(graph=graph, positions=positions, width=grid_size[0], height=grid_size[1])
+		elif renderer == "widgets":
+			self._graph_widget = GraphWidget(graph=graph, positions=positions)
+		else:
+			raise ValueError("unknown renderer: " + renderer)
 		self._select_button = QtWidgets.QPushButton("Select")
 		self._select_button.setFixedSize(100, 30)
 		self._select_button.clicked.connect(lambda: self._state.select_click())
@@ -25,6 +40,19 @@ class GraphMainWindow(QtWidgets.QMainWindow):
 		self._step_button.setFixedSize(100, 30)
 		self._step_button.clicked.connect(lambda: self._state.step_click())
 
+		# Plays the steps back at the speed of the slider, from 1 to 10^6 steps per second
+		self._play_button = QtWidgets.QPushButton("Play")
+		self._play_button.setFixedSize(100, 30)
+		self._play_button.clicked.connect(lambda: self._state.play_click())
+
+		self._speed_slider = QtWidgets.QSlider(QtCore.Qt.Horizontal)
+		self._speed_slider.setRange(0, 60)
+		self._speed_slider.setFixedWidth(120)
+		self._speed_label = QtWidgets.QLabel()
+		self._speed_label.setFixedWidth(110)
+		self._speed_slider.valueChanged.connect(lambda value: self.set_speed(10 ** (value / 10)))
+		self._speed_slider.setValue(20)
+
 		self._reset_button = QtWidgets.QPushButton("Reset")
 		self._reset_button.setFixedSize(100, 30)
 		self._reset_button.clicked.connect(lambda: self._state.reset_click())
@@ -32,12 +60,20 @@ class GraphMainWindow(QtWidgets.QMainWindow):
 		self._toolbar.addWidget(label)
 		self._toolbar.addWidget(self._select_button)
 		self._toolbar.addWidget(self._step_button)
+		self._toolbar.addWidget(self._play_button)
+		self._toolbar.addWidget(self._speed_slider)
+		self._toolbar.addWidget(self._speed_label)
+		self._save_button = QtWidgets.QPushButton("Save")
+		self._save_button.setFixedSize(100, 30)
+		self._save_button.clicked.connect(self.save_click)
+
 		self._toolbar.addWidget(self._reset_button)
+		self._toolbar.addWidget(self._save_button)
 
 		self.addToolBar(self._toolbar)
 		self.setCentralWidget(self._graph_widget)
 
-	def get_graph_widget(self) -> GraphWidget:
+	def get_graph_widget(self) -> QtWidgets.QWidget:
 		return self._graph_widget
 
 	def get_source(self) -> Vertex:
@@ -52,6 +88,19 @@ class GraphMainWindow(QtWidgets.QMainWindow):
 	def set_step_button(self, enabled: bool = True) -> None:
 		self._step_button.setEnabled(enabled)
 
+	def set_play_button(self, enabled: bool = True) -> None:
+		self._play_button.setEnabled(enabled)
+
+	def get_speed(self) -> float:
+		return self._speed
+
+	# Playback speed in steps per second
+	def set_speed(self, speed: float) -> None:
+		self._speed = speed
+		self._speed_label.setText("%d steps/s" % round(speed))
+		if self._player is not None:
+			self._player.set_speed(speed)
+
 	def set_state(self, state: State) -> None:
 		self._state = state
 
@@ -61,59 +110,155 @@ class GraphMainWindow(QtWidgets.QMainWindow):
 	def set_destination(self, destination: Vertex) -> None:
 		self._destination = destination
 
+	def get_runner(self) -> AlgorithmRunner:
+		return self._runner
+
+	def get_player(self) -> AlgorithmPlayer:
+		return self._player
+
+	# The run works on a snapshot of the graph, the widget only shows the progress it sends
 	def dijkstra_init(self) -> None:
-		self._graph.dijkstra_init(self._source, self._destination)
+		self.dijkstra_cancel()
+		runner = AlgorithmRunner(self._graph, self._source, self._destination, self)
+		# Signals already on their way from a cancelled run are dropped
+		runner.progress.connect(lambda progress: self._algorithm_progress(runner, progress))
+		runner.finished.connect(lambda progress: self._algorithm_finished(runner, progress))
+		self._runner = runner
+		self._player = AlgorithmPlayer(runner, self._speed, runner)
+		self._player.finished.connect(lambda: self._state.play_finished())
+
+		self._graph_widget.reset()
+		progress = runner.get_progress()
+		self._graph_widget.apply_progress(progress)
+		self.show_progress(progress)
+
+	def dijkstra_step(self, steps: int = 1) -> None:
+		if self._runner is not None:
+			self._runner.start(steps)
+
+	def dijkstra_play(self) -> None:
+		if self._player is not None:
+			self._player.play()
+			self._play_button.setText("Pause")
+
+	def dijkstra_pause(self) -> None:
+		if self._player is not None:
+			self._player.pause()
+		self._play_button.setText("Play")
+
+	def is_dijkstra_done(self) -> bool:
+		return self._runner is not None and self._runner.get_stepper().is_done()
+
+	def dijkstra_cancel(self) -> None:
+		self.dijkstra_pause()
+		if self._runner is not None:
+			self._runner.dispose()
+			self._runner = None
+			self._player = None
+		self.statusBar().clearMessage()
+
+	# Step, current vertex and the instrumentation counters of the run in the status bar
+	def show_progress(self, progress: AlgorithmProgress) -> None:
+		counters = progress.get_counters()
+		message = "Step %d, current %s" % (progress.get_step(), progress.get_current())
+		message += "".join(", %s %d" % (name.replace("_", " "), counters[name])
+						   for name in ("settled", "pushes", "stale_pops", "relaxations", "improvements"))
+		if progress.is_done():
+			message += ", done"
+		self.statusBar().showMessage(message)
+
+	def _algorithm_progress(self, runner: AlgorithmRunner, progress: AlgorithmProgress) -> None:
+		if runner is self._runner:
+			self._graph_widget.apply_progress(progress)
+			self.show_progress(progress)
+
+	def _algorithm_finished(self, runner: AlgorithmRunner, progress: AlgorithmProgress) -> None:
+		if runner is self._runner:
+			self._graph_widget.apply_progress(progress)
+			self.show_progress(progress)
+			# While playing, PlayState owns the buttons and sets them again once the playback stops
+			if not self._player.is_playing():
+				self.set_step_button(not progress.is_done())
+				self.set_play_button(not progress.is_done())
+
+	def save_click(self) -> None:
+		path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Save graph", "", "Graph snapshot (*.qtgs)")
+		if path:
+			self.save_snapshot(path)
+
+	# Save the graph together with the current grid cell of every vertex
+	def save_snapshot(self, path: str) -> None:
+		graphio.save_snapshot(path, self._graph, self._graph_widget.get_grid_positions())
+
+
+def load_snapshot(path: str) -> Tuple[Graph, Dict[Vertex, Tuple[int, int]]]:
+	with graphio.open_snapshot(path) as snapshot:
+		graph, vertices = snapshot.get_graph().to_graph()
+		cells = snapshot.get_positions()
+
+		positions = None
+		if cells is not None:
+			positions = {vert: tuple(cell) for vert, cell in zip(vertices, cells.tolist()) if cell[0] >= 0}
+
+	return graph, positions
 
 
 if __name__ == '__main__':
 	# Example
 	app = QtWidgets.QApplication(sys.argv)
 
-	vert_a = Vertex()
-	vert_b = Vertex()
-	vert_c = Vertex()
-	vert_d = Vertex()
-	vert_e = Vertex()
-	vert_f = Vertex()
-	vert_g = Vertex()
-	vert_h = Vertex()
-	vert_i = Vertex()
-	vert_j = Vertex()
-
-	graph = Graph()
-	graph.append(vert_a)
-	graph.append(vert_b)
-	graph.append(vert_c)
-	graph.append(vert_d)
-	graph.append(vert_e)
-	graph.append(vert_f)
-	graph.append(vert_g)
-	graph.append(vert_h)
-	graph.append(vert_i)
-	graph.append(vert_j)
-
-	graph.connect(vert_a, vert_b, 1)
-	graph.connect(vert_a, vert_c, 2)
-	graph.connect(vert_b, vert_d, 1)
-	graph.connect(vert_e, vert_a, 7)
-
-	graph.connect(vert_a, vert_f, 4)
-	graph.connect(vert_a, vert_g, 3)
-	graph.connect(vert_h, vert_d, 3)
-	graph.connect(vert_j, vert_e, 4)
-
-	graph.connect(vert_j, vert_b, 5)
-	graph.connect(vert_i, vert_c, 6)
-	graph.connect(vert_h, vert_g, 7)
-	graph.connect(vert_i, vert_f, 7)
-
-	graph.connect(vert_a, vert_e, 8)
-	graph.connect(vert_c, vert_i, 2)
-	graph.connect(vert_b, vert_j, 4)
-	graph.connect(vert_e, vert_h, 7)
+	# Open a saved snapshot if one is given, otherwise build the example graph. --canvas picks the GraphCanvas renderer.
+	positions = None
+	renderer = "canvas" if "--canvas" in sys.argv else "widgets"
+	snapshots = [arg for arg in sys.argv[1:] if arg.endswith(".qtgs")]
+	if snapshots:
+		graph, positions = load_snapshot(snapshots[0])
+	else:
+		vert_a = Vertex()
+		vert_b = Vertex()
+		vert_c = Vertex()
+		vert_d = Vertex()
+		vert_e = Vertex()
+		vert_f = Vertex()
+		vert_g = Vertex()
+		vert_h = Vertex()
+		vert_i = Vertex()
+		vert_j = Vertex()
+
+		graph = Graph()
+		graph.append(vert_a)
+		graph.append(vert_b)
+		graph.append(vert_c)
+		graph.append(vert_d)
+		graph.append(vert_e)
+		graph.append(vert_f)
+		graph.append(vert_g)
+		graph.append(vert_h)
+		graph.append(vert_i)
+		graph.append(vert_j)
+
+		graph.connect(vert_a, vert_b, 1)
+		graph.connect(vert_a, vert_c, 2)
+		graph.connect(vert_b, vert_d, 1)
+		graph.connect(vert_e, vert_a, 7)
+
+		graph.connect(vert_a, vert_f, 4)
+		graph.connect(vert_a, vert_g, 3)
+		graph.connect(vert_h, vert_d, 3)
+		graph.connect(vert_j, vert_e, 4)
+
+		graph.connect(vert_j, vert_b, 5)
+		graph.connect(vert_i, vert_c, 6)
+		graph.connect(vert_h, vert_g, 7)
+		graph.connect(vert_i, vert_f, 7)
+
+		graph.connect(vert_a, vert_e, 8)
+		graph.connect(vert_c, vert_i, 2)
+		graph.connect(vert_b, vert_j, 4)
+		graph.connect(vert_e, vert_h, 7)
 
 	# UI
-	window = GraphMainWindow(graph)
+	window = GraphMainWindow(graph, positions, renderer)
 	State.window = window
 	State.graph_widget = window.get_graph_widget()
 	window.set_state(DefaultState())
@@ -0,0 +1,570 @@
+from typing import List, Dict, Tuple, Callable, Any
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import graphdelta
+import graphio
+import graphlayout
+from graphutils import Graph, Vertex, Instrumentation, ShortestPathCache, grid_heuristic
+
+
+SIZES = (10, 100, 1000, 10 ** 4, 10 ** 5, 10 ** 6)
+QUICK_SIZES = (10, 100, 1000)
+GRAPH_KINDS = ("grid", "random", "scale_free")
+# Seconds the headless query tool may spend importing modules, Qt alone takes longer
+STARTUP_IMPORT_BUDGET = 0.3
+
+# Process counts of the batch cases: 1, 2, 4, ... up to the number of CPUs
+BATCH_PROCESSES = tuple(2 ** i for i in range((os.cpu_count() or 1).bit_length()))
+
+# Registered benchmark cases: (name, factory, graph kinds, part of the quick subset, largest size)
+CASES = []
+
+
+# Deterministic random sparse graph with roughly `degree` edges per vertex
+def random_graph(count: int, degree: int = 4, seed: int = 0) -> Graph:
+	rng = random.Random(seed)
+	vertices = [Vertex(str(i)) for i in range(count)]
+	graph = Graph(*vertices)
+
+	for i in range(1, count):
+		# Spanning path keeps the graph connected
+		graph.connect(vertices[i - 1], vertices[i], rng.randint(1, 100))
+
+	for _ in range(count * (degree // 2 - 1)):
+		graph.connect(vertices[rng.randrange(count)], vertices[rng.randrange(count)], rng.randint(1, 100))
+
+	return graph
+
+
+# Deterministic side x side grid graph and the grid position of every vertex
+def grid_graph(side: int, seed: int = 0) -> Tuple[Graph, Dict[Vertex, Tuple[int, int]]]:
+	rng = random.Random(seed)
+	vertices = [Vertex(str(i)) for i in range(side * side)]
+	graph = Graph(*vertices)
+	positions = {vert: divmod(i, side) for i, vert in enumerate(vertices)}
+
+	for i, vert in enumerate(vertices):
+		row, column = divmod(i, side)
+		if column + 1 < side:
+			graph.connect(vert, vertices[i + 1], rng.randint(1, 10))
+		if row + 1 < side:
+			graph.connect(vert, vertices[i + side], rng.randint(1, 10))
+
+	return graph, positions
+
+
+# Deterministic Barabasi-Albert graph, every new vertex attaches to `edges` vertices picked by degree
+def scale_free_graph(count: int, edges: int = 2, seed: int = 0) -> Graph:
+	rng = random.Random(seed)
+	vertices = [Vertex(str(i)) for i in range(count)]
+	graph = Graph(*vertices)
+	# Every vertex appears here once per edge end, so a uniform pick is a pick by degree
+	ends = []
+
+	for i in range(1, count):
+		targets = {0} if i <= edges else {ends[rng.randrange(len(ends))] for _ in range(edges)}
+		for target in targets:
+			graph.connect(vertices[i], vertices[target], rng.randint(1, 100))
+			ends += (i, target)
+
+	return graph
+
+
+def make_graph(kind: str, count: int) -> Tuple[Graph, Dict[Vertex, Tuple[int, int]]]:
+	if kind == "grid":
+		return grid_graph(max(2, math.isqrt(count)))
+	elif kind == "random":
+		return random_graph(count), None
+	elif kind == "scale_free":
+		return scale_free_graph(count), None
+
+	raise ValueError("unknown graph kind: " + kind)
+
+
+def edge_count(graph: Graph) -> int:
+	return sum(len(vert.keys()) for vert in graph)
+
+
+# Register a benchmark case. The factory gets (graph, positions) and does its setup untimed,
+# then returns the function that is timed. That function returns the operation counts it performed.
+# Every call of the factory gets a freshly built graph, so a case may change its graph.
+def case(name: str, kinds: Tuple[str, ...] = GRAPH_KINDS, quick: bool = True, max_count: int = SIZES[-1]):
+	def register(factory: Callable) -> Callable:
+		CASES.append((name, factory, kinds, quick, max_count))
+		return factory
+
+	return register
+
+
+@case("dijkstra")
+def dijkstra_case(graph: Graph, positions: Any) -> Callable[[], Dict[str, int]]:
+	graph.set_cache(None)
+	source = graph[0]
+
+	vertices, edges = len(graph), edge_count(graph)
+
+	def run():
+		start = time.perf_counter()
+		settled = len(graph.shortest_path_tree(source).get_distance_dict())
+		seconds = time.perf_counter() - start
+		# Time per unit of the O((V + E) log V) bound, roughly constant across sizes when the heap behaves
+		normalized = seconds / ((vertices + edges) * math.log2(max(vertices, 2))) * 1e9
+		return {"settled": settled, "ns_per_vlogv": round(normalized, 2)}
+
+	return run
+
+
+# Same search as "dijkstra" with instrumentation on, the difference is the cost of the counters and timings
+@case("dijkstra_instrumented", quick=False)
+def dijkstra_instrumented_case(graph: Graph, positions: Any) -> Callable[[], Dict[str, int]]:
+	graph.set_cache(None)
+	source = graph[0]
+
+	def run():
+		instrumentation = Instrumentation()
+		graph.set_instrumentation(instrumentation)
+		graph.shortest_path_tree(source)
+		graph.set_instrumentation(None)
+
+		counts = instrumentation.get_counters()
+		counts.update({phase + "_seconds": seconds for phase, seconds in instrumentation.get_timings().items()})
+		return counts
+
+	return run
+
+
+@case("dijkstra_step")
+def dijkstra_step_case(graph: Graph, positions: Any) -> Callable[[], Dict[str, int]]:
+	def run():
+		graph.dijkstra_init(graph[0], graph[len(graph) - 1])
+		steps = graph.get_stepper().step(10 * len(graph))
+		return {"steps": steps}
+
+	return run
+
+
+@case("dijkstra_seek", quick=False)
+def dijkstra_seek_case(graph: Graph, positions: Any) -> Callable[[], Dict[str, int]]:
+	graph.dijkstra_init(graph[0], graph[len(graph) - 1])
+	stepper = graph.get_stepper()
+	total = stepper.step(10 * len(graph))
+	targets = random.Random(4).choices(range(total + 1), k=20)
+
+	def run():
+		for target in targets:
+			stepper.seek(target)
+		return {"seeks": len(targets), "steps": total}
+
+	return run
+
+
+@case("connect")
+def connect_case(graph: Graph, positions: Any) -> Callable[[], Dict[str, int]]:
+	edges = [(vert, neighbor, weigh) for vert in graph for neighbor, weigh in vert]
+
+	def run():
+		vertices = {vert: Vertex(str(vert)) for vert in graph}
+		copy = Graph(*vertices.values())
+		for vert, neighbor, weigh in edges:
+			copy.connect(vertices[vert], vertices[neighbor], weigh)
+		return {"appends": len(vertices), "connects": len(edges)}
+
+	return run
+
+
+@case("disconnect")
+def disconnect_case(graph: Graph, positions: Any) -> Callable[[], Dict[str, int]]:
+	copy, vertices = graph.compact().to_graph()
+
+	def run():
+		disconnects = 0
+		for vert in vertices:
+			for neighbor in list(vert.keys()):
+				copy.disconnect(vert, neighbor)
+				disconnects += 1
+		return {"disconnects": disconnects}
+
+	return run
+
+
+@case("iteration")
+def iteration_case(graph: Graph, positions: Any) -> Callable[[], Dict[str, int]]:
+	def run():
+		vertices, edges = 0, 0
+		for vert in graph:
+			vertices += 1
+			for _ in vert:
+				edges += 1
+		return {"vertices": vertices, "edges": edges}
+
+	return run
+
+
+@case("point_to_point", quick=False)
+def point_to_point_case(graph: Graph, positions: Any) -> Callable[[], Dict[str, int]]:
+	rng = random.Random(2)
+	vertices = list(graph)
+	pairs = [(rng.choice(vertices), rng.choice(vertices)) for _ in range(10)]
+	heuristic = grid_heuristic(graph, positions) if positions is not None else None
+
+	def run():
+		counts = {}
+		for method in ("early", "bidirectional", "astar"):
+			counts[method + "_settled"] = sum(graph.point_to_point(source, destination, method, heuristic).get_settled()
+											  for source, destination in pairs)
+		return counts
+
+	return run
+
+
+# Bytes per edge of the Vertex graph against the float64 and float32 CompactGraph
+@case("compact")
+def compact_case(graph: Graph, positions: Any) -> Callable[[], Dict[str, int]]:
+	edges = [(vert, neighbor, weigh) for vert in graph for neighbor, weigh in vert if vert < neighbor]
+	tracemalloc.start()
+	vertices = {vert: Vertex(str(vert)) for vert in graph}
+	copy = Graph(*vertices.values())
+	for vert, neighbor, weigh in edges:
+		copy.connect(vertices[vert], vertices[neighbor], weigh)
+	graph_bytes = tracemalloc.get_traced_memory()[0]
+	tracemalloc.stop()
+	graph_bytes_per_edge = graph_bytes / max(edge_count(copy), 1)
+	del vertices, copy
+
+	def run():
+		compact = graph.compact()
+		compact_32 = graph.compact("float32")
+		return {"edges": compact.edge_count(), "graph_bytes_per_edge": round(graph_bytes_per_edge, 1),
+				"bytes_per_edge": compact.bytes_per_edge(), "float32_bytes_per_edge": compact_32.bytes_per_edge()}
+
+	return run
+
+
+@case("compact_dijkstra", quick=False)
+def compact_dijkstra_case(graph: Graph, positions: Any) -> Callable[[], Dict[str, int]]:
+	compact = graph.compact()
+
+	def run():
+		return {"settled": int(np.isfinite(compact.distances(0)).sum())}
+
+	return run
+
+
+# Delta-stepping on the CompactGraph against Graph.dijkstra on the same graph, timed once when the case is set up
+@case("delta_stepping", quick=False)
+def delta_stepping_case(graph: Graph, positions: Any) -> Callable[[], Dict[str, int]]:
+	start = time.perf_counter()
+	tree = graph.shortest_path_tree(graph[0])
+	seconds = time.perf_counter() - start
+	expected = np.array([tree.get_distance(vert) for vert in graph])
+	engine = graphdelta.DeltaStepping(graph.compact())
+
+	def run():
+		start = time.perf_counter()
+		distances = engine.distances(0)
+		counts = engine.get_stats()
+		counts.update({"delta": round(engine.get_delta(), 2), "matches": bool(np.array_equal(distances, expected)),
+					   "speedup": round(seconds / (time.perf_counter() - start), 1)})
+		return counts
+
+	return run
+
+
+# Edge changes repaired by a DynamicShortestPathTree: 20 edges get three times longer, shorter again, removed and
+# added back. The counts show how many vertices the repairs touched, compare with the number of vertices.
+@case("dynamic_tree", quick=False)
+def dynamic_tree_case(graph: Graph, positions: Any) -> Callable[[], Dict[str, int]]:
+	rng = random.Random(5)
+	vertices = list(graph)
+	edges = []
+	while len(edges) < 20:
+		vert = rng.choice(vertices)
+		if len(vert) > 0:
+			neighbor = rng.choice(list(vert.keys()))
+			edges.append((vert, neighbor, vert[neighbor]))
+	tree = graph.dynamic_tree(graph[0])
+
+	def run():
+		for vert, neighbor, weigh in edges:
+			graph.connect(vert, neighbor, 3 * weigh)
+			graph.connect(vert, neighbor, weigh)
+			graph.disconnect(vert, neighbor)
+			graph.connect(vert, neighbor, weigh)
+		tree.close()
+		return tree.get_stats()
+
+	return run
+
+
+@case("set_weight", quick=False)
+def set_weight_case(graph: Graph, positions: Any) -> Callable[[], Dict[str, int]]:
+	rng = random.Random(7)
+	vertices = list(graph)
+	edges = []
+	while len(edges) < 200:
+		vert = rng.choice(vertices)
+		if len(vert) > 0:
+			neighbor = rng.choice(list(vert.keys()))
+			edges.append((vert, neighbor, vert[neighbor]))
+	tree = graph.dynamic_tree(graph[0])
+
+	# Every edge is edited twice per batch, the tree is repaired once per batch for the edges that changed
+	def run():
+		with graph.batch():
+			for vert, neighbor, weigh in edges:
+				graph.set_weight(vert, neighbor, 2 * weigh + 1)
+				graph.set_weight(vert, neighbor, 3 * weigh)
+		with graph.batch():
+			for vert, neighbor, weigh in edges:
+				graph.set_weight(vert, neighbor, weigh)
+		tree.close()
+		return tree.get_stats()
+
+	return run
+
+
+@case("cache", kinds=("random",), quick=False)
+def cache_case(graph: Graph, positions: Any) -> Callable[[], Dict[str, int]]:
+	rng = random.Random(1)
+	vertices = list(graph)
+	hot = [rng.choice(vertices) for _ in range(8)]
+	queries = [(rng.choice(hot), rng.choice(vertices)) for _ in range(500)]
+
+	def run():
+		graph.set_cache(ShortestPathCache())
+		for i, (source, destination) in enumerate(queries):
+			graph.dijkstra(source, destination)
+			# An edit every hundred queries invalidates the cached trees, the graph is not reused by other cases
+			if i % 100 == 99:
+				graph.connect(source, destination, 1)
+		return graph.get_cache().stats()
+
+	return run
+
+
+# One case per process count, batch_1, batch_2, batch_4, ..., shows how the batch queries scale with the cores
+def batch_case(processes: int) -> Callable:
+	def factory(graph: Graph, positions: Any) -> Callable[[], Dict[str, int]]:
+		sources = list(graph)[:16]
+
+		def run():
+			start = time.perf_counter()
+			graph.distance_matrix(sources, processes)
+			rows_per_second = len(sources) / (time.perf_counter() - start)
+			return {"sources": len(sources), "processes": processes, "rows_per_second": round(rows_per_second, 1)}
+
+		return run
+
+	return factory
+
+
+for _processes in BATCH_PROCESSES:
+	case("batch_" + str(_processes), kinds=("random",), quick=False, max_count=10 ** 5)(batch_case(_processes))
+
+
+# The same edges loaded from the text and from the binary edge list
+@case("loader", kinds=("random",), quick=False)
+def loader_case(graph: Graph, positions: Any) -> Callable[[], Dict[str, int]]:
+	directory = tempfile.mkdtemp()
+	text_path, binary_path = os.path.join(directory, "edges.tsv"), os.path.join(directory, "edges.bin")
+	with open(text_path, "w") as f:
+		f.writelines(f"{vert}\t{neighbor}\t{weigh}\n" for vert in graph for neighbor, weigh in vert if vert < neighbor)
+
+	compact = graph.compact()
+	sources = np.repeat(np.arange(len(compact)), np.diff(compact.get_offsets()))
+	once = sources < compact.get_targets()
+	graphio.save_binary_edges(binary_path, sources[once], compact.get_targets()[once], compact.get_weights()[once])
+	edges = int(once.sum())
+
+	def run():
+		counts = {}
+		for name, load, path in (("tsv", graphio.load_edge_list, text_path), ("binary", graphio.load_binary_edges, binary_path)):
+			start = time.perf_counter()
+			counts[name + "_edges"] = load(path).edge_count()
+			counts[name + "_edges_per_second"] = round(edges / (time.perf_counter() - start))
+		return counts
+
+	return run
+
+
+@case("layout", quick=False, max_count=10 ** 5)
+def layout_case(graph: Graph, positions: Any) -> Callable[[], Dict[str, int]]:
+	compact = graph.compact()
+	# A grid with about half of its cells free, like the one GraphCanvas makes
+	side = math.ceil(math.sqrt(2 * len(compact)))
+
+	def run():
+		layout = graphlayout.ForceLayout(compact)
+		layout.step(layout.get_iterations())
+		cells = layout.snap(side, side)
+		sources = np.repeat(np.arange(len(compact)), np.diff(compact.get_offsets()))
+		length = np.abs(cells[sources] - cells[compact.get_targets()]).sum(axis=1)
+		return {"iterations": layout.get_iteration(), "mean_edge_cells": round(float(length.mean()), 2) if len(length) else 0}
+
+	return run
+
+
+# Runs graphcli in a fresh interpreter on a small graph. Fails when it imports PySide2 or its imports take
+# longer than STARTUP_IMPORT_BUDGET, as reported by -X importtime.
+@case("startup", kinds=("none",), max_count=10)
+def startup_case(count: int, positions: Any) -> Callable[[], Dict[str, int]]:
+	directory = tempfile.mkdtemp()
+	graph_path, queries_path = os.path.join(directory, "edges.tsv"), os.path.join(directory, "queries.txt")
+	with open(graph_path, "w") as f:
+		f.writelines(f"{i}\t{i + 1}\t1\n" for i in range(count - 1))
+	with open(queries_path, "w") as f:
+		f.write(f"0 {count - 1}\n")
+	script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "graphcli.py")
+
+	def run():
+		process = subprocess.run([sys.executable, "-X", "importtime", script, graph_path, "--queries", queries_path],
+								 capture_output=True, text=True, check=True)
+		# Lines of -X importtime: "import time: self [us] | cumulative | imported package"
+		modules = [line.split("|") for line in process.stderr.splitlines()
+				   if line.startswith("import time:") and line.split("|")[0].split(":")[1].strip().isdigit()]
+		seconds = sum(int(fields[0].split(":")[1]) for fields in modules) / 10 ** 6
+		qt = [fields[2].strip() for fields in modules if fields[2].strip().startswith("PySide2")]
+
+		if qt:
+			raise RuntimeError("graphcli imports Qt: " + ", ".join(qt))
+		if seconds > STARTUP_IMPORT_BUDGET:
+			raise RuntimeError(f"graphcli imports take {seconds:.3f} s, the budget is {STARTUP_IMPORT_BUDGET} s")
+		return {"modules": len(modules), "import_ms": round(seconds * 1000)}
+
+	return run
+
+
+@case("vertices", kinds=("none",))
+def vertices_case(count: int, positions: Any) -> Callable[[], Dict[str, int]]:
+	tracemalloc.start()
+	graph = Graph()
+	for _ in range(count):
+		graph.append(Vertex())
+	bytes_per_vertex = tracemalloc.get_traced_memory()[0] / count
+	tracemalloc.stop()
+	del graph
+
+	def run():
+		start = time.perf_counter()
+		graph = Graph()
+		for _ in range(count):
+			graph.append(Vertex())
+		appends_per_second = count / (time.perf_counter() - start)
+		return {"appends": count, "appends_per_second": round(appends_per_second), "bytes_per_vertex": round(bytes_per_vertex, 1)}
+
+	return run
+
+
+# make() builds the graph and positions anew, so every run starts from the same graph whatever ran before it
+def measure(factory: Callable, make: Callable[[], Tuple[Any, Any]], repeat: int, memory: bool) -> Dict[str, Any]:
+	seconds = math.inf
+	for _ in range(repeat):
+		run = factory(*make())
+		start = time.perf_counter()
+		counts = run()
+		seconds = min(seconds, time.perf_counter() - start)
+
+	peak = None
+	if memory:
+		run = factory(*make())
+		tracemalloc.start()
+		run()
+		peak = tracemalloc.get_traced_memory()[1]
+		tracemalloc.stop()
+
+	return {"seconds": seconds, "peak_bytes": peak, "counts": counts}
+
+
+def run_suite(sizes: Tuple[int, ...], names: List[str] = None, kinds: Tuple[str, ...] = GRAPH_KINDS,
+			  quick: bool = False, repeat: int = 3, memory: bool = True) -> List[Dict[str, Any]]:
+	cases = [entry for entry in CASES if (names is None or entry[0] in names) and (entry[3] or not quick)]
+	results = []
+
+	for count in sizes:
+		for kind in kinds + ("none",):
+			selected = [entry for entry in cases if kind in entry[2] and count <= entry[4]]
+			if not selected:
+				continue
+
+			make = (lambda: make_graph(kind, count)) if kind != "none" else (lambda: (count, None))
+			graph = make()[0]
+			for name, factory, _, _, _ in selected:
+				result = measure(factory, make, repeat, memory)
+				result.update({"benchmark": name, "graph": kind, "size": count})
+				if kind != "none":
+					result.update({"vertices": len(graph), "edges": edge_count(graph)})
+				results.append(result)
+
+				peak = result["peak_bytes"] / 2 ** 20 if result["peak_bytes"] is not None else math.nan
+				print(f"{name:>18} {kind:>10} {count:>8} {result['seconds']:>10.4f} s {peak:>8.1f} MiB  {result['counts']}")
+
+	return results
+
+
+def save_results(path: str, results: List[Dict[str, Any]]) -> None:
+	with open(path, "w") as f:
+		json.dump({
+			"created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+			"python": sys.version.split()[0],
+			"machine": platform.machine(),
+			"cpus": os.cpu_count(),
+			"results": results,
+		}, f, indent=1)
+
+
+# Print the time ratio new / old of every result present in both files, flag those above threshold.
+# Counts that differ between the runs are listed below their result.
+def compare(old_path: str, new_path: str, threshold: float = 1.1) -> int:
+	with open(old_path) as f:
+		old = {(r["benchmark"], r["graph"], r["size"]): r for r in json.load(f)["results"]}
+	with open(new_path) as f:
+		new = {(r["benchmark"], r["graph"], r["size"]): r for r in json.load(f)["results"]}
+
+	regressions = 0
+	for key in sorted(old.keys() & new.keys()):
+		ratio = new[key]["seconds"] / max(old[key]["seconds"], 1e-9)
+		flag = ""
+		if ratio > threshold:
+			flag = "  REGRESSION"
+			regressions += 1
+		print(f"{key[0]:>18} {key[1]:>10} {key[2]:>8} {old[key]['seconds']:>10.4f} {new[key]['seconds']:>10.4f} {ratio:>6.2f}x{flag}")
+
+		# Counts that changed, e.g. bytes per edge or vertices settled
+		old_counts, new_counts = old[key]["counts"], new[key]["counts"]
+		for name in sorted(old_counts.keys() & new_counts.keys()):
+			if old_counts[name] != new_counts[name]:
+				print(f"{'':>38} {name}: {old_counts[name]} -> {new_counts[name]}")
+
+	return regressions
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Benchmarks of graphutils algorithms and data structures")
+	parser.add_argument("--quick", action="store_true", help="small sizes and the fast cases only")
+	parser.add_argument("--sizes", type=int, nargs="+", help="vertex counts, default 10 to 10^6")
+	parser.add_argument("--cases", nargs="+", choices=[entry[0] for entry in CASES])
+	parser.add_argument("--graphs", nargs="+", choices=GRAPH_KINDS, default=list(GRAPH_KINDS))
+	parser.add_argument("--repeat", type=int, default=3)
+	parser.add_argument("--no-memory", action="store_true", help="skip the traced run measuring peak memory")
+	parser.add_argument("--output", help="save the results as JSON")
+	parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two saved results")
+	parser.add_argument("--threshold", type=float, default=1.1, help="slowdown ratio reported as a regression")
+	args = parser.parse_args()
+
+	if args.compare:
+		sys.exit(1 if compare(args.compare[0], args.compare[1], args.threshold) else 0)
+
+	sizes = args.sizes or (QUICK_SIZES if args.quick else SIZES)
+	results = run_suite(tuple(sizes), args.cases, tuple(args.graphs), args.quick, args.repeat, not args.no_memory)
+	if args.output:
+		save_results(args.output, results)
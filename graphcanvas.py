@@ -0,0 +1,463 @@
+from typing import Dict, List, Tuple, Optional
+import math
+import time
+from PySide2 import QtWidgets, QtGui, QtCore
+from PySide2.QtCore import QPoint, QPointF, QRectF
+from vertexsystem.vertex import VertexWidget, DragAndDropWidget, SelectAnimation
+from vertexsystem.overlay import EdgeBatch
+from vertexsystem.spatial import SpatialIndex
+from graphlayout import make_layout
+from vertexsystem.progress import ProgressView
+from graphutils import Graph, Vertex
+
+
+"""
+Vertex drawn by GraphCanvas, the counterpart of VertexWidget without a widget of its own.
+"""
+class CanvasVertex:
+	__slots__ = ("_vertex", "_color", "_text")
+
+	def __init__(self, vertex: Vertex, color: QtGui.QColor, text: str = ""):
+		self._vertex = vertex
+		self._color = color
+		self._text = text
+
+	# Setters return whether the value changed, i.e. whether the vertex needs a repaint
+	def set_color(self, color: QtGui.QColor) -> bool:
+		changed = color is not self._color
+		self._color = color
+		return changed
+
+	def get_color(self) -> QtGui.QColor:
+		return self._color
+
+	# Set text label inside the vertex
+	def set_text(self, text: str) -> bool:
+		changed = text != self._text
+		self._text = text
+		return changed
+
+	def get_text(self) -> str:
+		return self._text
+
+	def get_vertex(self) -> Vertex:
+		return self._vertex
+
+	def is_empty(self) -> bool:
+		return self._vertex is None
+
+
+"""
+Single widget rendering of the grid, an alternative to GraphWidget for large grids.
+The grid lines are drawn once into a cached pixmap and only cells holding a vertex have an object,
+so startup time and memory grow with the number of vertices instead of the number of cells.
+The view zooms with the mouse wheel and pans by dragging empty space or with the middle button.
+Vertices and edges are kept in spatial indexes, so painting and hit tests only touch what is under the viewport.
+The force directed layout runs in the background of the event loop, a few iterations per frame, until it is done
+or the graph is edited.
+"""
+class GraphCanvas(ProgressView, QtWidgets.QWidget):
+	cell_size = VertexWidget.vertex_size + 2 * DragAndDropWidget.margin
+	# Side of a spatial index bucket in cells
+	bucket_cells = 8
+	min_zoom = 0.05
+	max_zoom = 8.0
+	# Below this zoom the weighs and vertex labels are too small to read and are not drawn
+	label_zoom = 0.5
+	# Changed vertices repainted one by one, more repaint the whole widget
+	dirty_limit = 256
+	# Time the layout may take per frame and the least time between two moves of the vertices to its cells
+	layout_frame_seconds = 0.012
+	layout_snap_seconds = 0.25
+
+	def __init__(self, graph: Graph, parent=None, positions: Dict[Vertex, Tuple[int, int]] = None,
+				 width: int = 30, height: int = 30):
+		super(GraphCanvas, self).__init__(parent)
+
+		self.setWindowTitle("Drag and Drop Graph")
+		self.setAcceptDrops(True)
+		# Width and height are number of cells in grid - horizontally and vertically. Large graphs get a grid
+		# with about half of its cells free.
+		side = math.ceil(math.sqrt(2 * len(graph)))
+		width, height = max(width, side), max(height, side)
+		self.width_cells = width
+		self.height_cells = height
+		self._graph = graph
+		self._vertex_color = QtGui.QColor(51, 153, 255)
+		self._settled_color = QtGui.QColor(120, 200, 120)
+		self._path_edges = set()
+
+		# Drawn vertices {vertex: CanvasVertex}, their cells {vertex: (row, column)} and the reverse lookup
+		self._vert_widget_dict = {}
+		self._vert_cell_dict = {}
+		self._cell_vert_dict = {}
+		# Edge geometry (a, b, weigh, vert, neighbor), one entry per undirected edge, indexed by position
+		self._edges = None
+		self._edges_version = None
+		bucket_size = GraphCanvas.cell_size * GraphCanvas.bucket_cells
+		self._vertex_index = SpatialIndex(bucket_size)
+		self._edge_index = SpatialIndex(bucket_size)
+		# Batch of the visible edges and the bucket range and label setting it was built for
+		self._edge_batch = None
+		self._edge_batch_key = None
+		self._grid_tile = None
+
+		# View transform: widget position = scene position * zoom + offset
+		self._zoom = 1.0
+		self._offset = QPointF(0, 0)
+		self._pan_start = None
+		self._pan_offset = None
+
+		# Vertex under the mouse press and the vertex being dragged, hidden while it is dragged
+		self._press_vertex = None
+		self._press_pos = None
+		self._drag_vertex = None
+		self._animation = None
+
+		# Vertices with a saved cell keep it, the others start at random cells and follow the layout
+		self._layout, self._fixed_cells = make_layout(graph, width, height, positions=positions)
+		for vert, cell in self._layout.cells(width, height, self._fixed_cells).items():
+			self._place(vert, cell)
+
+		self._layout_snapped = time.perf_counter()
+		# Seconds taken by the last snap and by the last rebuild of the edge geometry that follows it
+		self._layout_snap_cost = 0.0
+		self._edges_cost = 0.0
+		self._layout_timer = QtCore.QTimer(self)
+		self._layout_timer.timeout.connect(self._layout_tick)
+		self._layout_timer.start(0)
+
+		# Edges edited through the graph, a Graph.batch included, are redrawn once the edit is reported
+		graph.on_change(self._edges_changed)
+
+		self.setMinimumSize(200, 200)
+
+	def sizeHint(self) -> QtCore.QSize:
+		size = GraphCanvas.cell_size
+		return QtCore.QSize(min(size * self.width_cells + 50, 1200), min(size * self.height_cells + 50, 900))
+
+	def _place(self, vertex: Vertex, cell: Tuple[int, int]) -> None:
+		self._vert_widget_dict[vertex] = CanvasVertex(vertex, self._vertex_color, str(vertex))
+		self._vert_cell_dict[vertex] = cell
+		self._cell_vert_dict[cell] = vertex
+		self._index_vertex(vertex)
+
+	def _index_vertex(self, vertex: Vertex) -> None:
+		center, radius = self.get_cell_center(self._vert_cell_dict[vertex]), VertexWidget.vertex_size / 2
+		self._vertex_index.insert(vertex, (center.x() - radius, center.y() - radius,
+										   center.x() + radius, center.y() + radius))
+
+	def is_layout_running(self) -> bool:
+		return self._layout_timer.isActive()
+
+	def stop_layout(self) -> None:
+		self._layout_timer.stop()
+
+	def _layout_tick(self) -> None:
+		start = time.perf_counter()
+		while self._layout.step() and time.perf_counter() - start < GraphCanvas.layout_frame_seconds:
+			pass
+
+		# Moving the vertices and rebuilding the edges takes as long as many iterations on large graphs,
+		# so most of the time goes to the layout itself
+		interval = max(GraphCanvas.layout_snap_seconds, 3 * (self._layout_snap_cost + self._edges_cost))
+		if self._layout.is_done() or start - self._layout_snapped >= interval:
+			self._apply_layout()
+		if self._layout.is_done():
+			self.stop_layout()
+
+	# Move every vertex to its cell in the current state of the layout
+	def _apply_layout(self) -> None:
+		start = time.perf_counter()
+		cells = self._layout.cells(self.width_cells, self.height_cells, self._fixed_cells)
+		moved = [vert for vert, cell in cells.items() if self._vert_cell_dict[vert] != cell]
+		self._vert_cell_dict = cells
+		self._cell_vert_dict = {cell: vert for vert, cell in cells.items()}
+		for vert in moved:
+			self._index_vertex(vert)
+
+		self.invalidate_geometry()
+		self._layout_snapped = time.perf_counter()
+		self._layout_snap_cost = self._layout_snapped - start
+
+	# A single cell with its border, like the border painted by each DragAndDropWidget, tiled over the grid
+	def _build_grid_tile(self) -> QtGui.QPixmap:
+		size = GraphCanvas.cell_size
+		tile = QtGui.QPixmap(size, size)
+		tile.fill(QtCore.Qt.transparent)
+
+		qp = QtGui.QPainter()
+		qp.begin(tile)
+		qp.setPen(QtGui.QPen(QtGui.QColor(220, 220, 220)))
+		qp.drawRect(0, 0, size - 1, size - 1)
+		qp.end()
+		return tile
+
+	def get_transform(self) -> QtGui.QTransform:
+		return QtGui.QTransform(self._zoom, 0, 0, self._zoom, self._offset.x(), self._offset.y())
+
+	def map_to_scene(self, qpoint: QPoint) -> QPointF:
+		return (QPointF(qpoint) - self._offset) / self._zoom
+
+	def map_from_scene(self, qpoint: QPointF) -> QPoint:
+		return (qpoint * self._zoom + self._offset).toPoint()
+
+	def paintEvent(self, event: QtGui.QPaintEvent):
+		if self._grid_tile is None:
+			self._grid_tile = self._build_grid_tile()
+		if self._edges is None or self._edges_version != self._graph.get_version():
+			self._build_edges()
+			self._edges_version = self._graph.get_version()
+
+		qp = QtGui.QPainter()
+		qp.begin(self)
+		qp.setWorldTransform(self.get_transform())
+
+		size = GraphCanvas.cell_size
+		inverse = self.get_transform().inverted()[0]
+		visible = inverse.mapRect(QRectF(event.rect()))
+		rect = (visible.left(), visible.top(), visible.right(), visible.bottom())
+
+		grid = visible.intersected(QRectF(0, 0, size * self.width_cells, size * self.height_cells))
+		if not grid.isEmpty():
+			qp.drawTiledPixmap(grid, self._grid_tile, QPointF(grid.left() % size, grid.top() % size))
+
+		# The batch covers the whole viewport, so repainting a few vertices only copies part of its cached pixmap.
+		# It only changes when the viewport crosses into other buckets.
+		labels = self._zoom >= GraphCanvas.label_zoom
+		bucket_size = size * GraphCanvas.bucket_cells
+		viewport = inverse.mapRect(QRectF(self.rect()))
+		viewport = (viewport.left(), viewport.top(), viewport.right(), viewport.bottom())
+		key = (tuple(int(value // bucket_size) for value in viewport), labels)
+		if self._edge_batch is None or self._edge_batch_key != key:
+			bucket_rect = (key[0][0] * bucket_size, key[0][1] * bucket_size,
+						   (key[0][2] + 1) * bucket_size, (key[0][3] + 1) * bucket_size)
+			edges = [self._edges[i] for i in sorted(self._edge_index.query(bucket_rect))]
+			self._edge_batch = EdgeBatch([[a, b, weigh, (vert, neighbor) in self._path_edges]
+										  for a, b, weigh, vert, neighbor in edges], labels)
+			self._edge_batch_key = key
+		self._edge_batch.paint(qp)
+
+		radius = VertexWidget.vertex_size / 2
+		for vert in self._vertex_index.query(rect):
+			if vert is self._drag_vertex:
+				continue
+
+			item = self._vert_widget_dict[vert]
+			center = self.get_cell_center(self._vert_cell_dict[vert])
+			qp.setPen(QtGui.QColor(255, 255, 255))
+			qp.setBrush(item.get_color())
+			qp.drawEllipse(center, radius, radius)
+
+			if labels:
+				qp.setPen(QtGui.QColor(10, 10, 10))
+				qp.drawText(center + QPoint(-3, 4), item.get_text())
+
+		qp.end()
+
+	def _build_edges(self) -> None:
+		start = time.perf_counter()
+		self._edges = []
+		self._edge_index.clear()
+		self._edge_batch = None
+		centers = {vert: self.get_cell_center(cell) for vert, cell in self._vert_cell_dict.items()}
+
+		seen = set()
+
+		for vert in self._graph:
+			for neighbor, weigh in vert:
+				# Both directions are drawn as one line, keep the one seen first
+				if (neighbor, vert) in seen:
+					continue
+				seen.add((vert, neighbor))
+
+				a, b = centers[vert], centers[neighbor]
+				self._edge_index.insert(len(self._edges), (a.x(), a.y(), b.x(), b.y()))
+				self._edges.append((a, b, weigh, vert, neighbor))
+
+		self._edges_cost = time.perf_counter() - start
+
+	# Drop the cached edge list, it is rebuilt on the next paint
+	def invalidate_geometry(self) -> None:
+		self._edges = None
+		self.update()
+
+	# Pixel centre of a grid cell
+	def get_cell_center(self, cell: Tuple[int, int]) -> QPoint:
+		size = GraphCanvas.cell_size
+		return QPoint(cell[1] * size + size // 2, cell[0] * size + size // 2)
+
+	# Grid cell under a point of the widget, None outside of the grid
+	def cell_at(self, qpoint: QPoint) -> Optional[Tuple[int, int]]:
+		scene = self.map_to_scene(qpoint)
+		row, column = int(scene.y() // GraphCanvas.cell_size), int(scene.x() // GraphCanvas.cell_size)
+		if 0 <= row < self.height_cells and 0 <= column < self.width_cells:
+			return row, column
+		return None
+
+	def get_zoom(self) -> float:
+		return self._zoom
+
+	# Scale the view by factor, keeping the scene point under anchor (a widget position) in place
+	def zoom_by(self, factor: float, anchor: QPoint = None) -> None:
+		anchor = QPointF(anchor) if anchor is not None else QPointF(self.width() / 2, self.height() / 2)
+		scene = (anchor - self._offset) / self._zoom
+
+		self._zoom = min(max(self._zoom * factor, GraphCanvas.min_zoom), GraphCanvas.max_zoom)
+		self._offset = anchor - scene * self._zoom
+		self.update()
+
+	def pan_by(self, dx: float, dy: float) -> None:
+		self._offset += QPointF(dx, dy)
+		self.update()
+
+	def wheelEvent(self, event: QtGui.QWheelEvent):
+		self.zoom_by(1.25 ** (event.angleDelta().y() / 120), event.pos())
+
+	def mousePressEvent(self, event: QtGui.QMouseEvent):
+		self._press_vertex = self.vertex_at(event.pos()) if event.button() == QtCore.Qt.LeftButton else None
+		self._press_pos = event.pos()
+
+		# Empty space or the middle button pans the view
+		self._pan_start = None
+		if self._press_vertex is None and event.button() in (QtCore.Qt.LeftButton, QtCore.Qt.MiddleButton):
+			self._pan_start = event.pos()
+			self._pan_offset = QPointF(self._offset)
+
+	def mouseMoveEvent(self, event: QtGui.QMouseEvent):
+		if self._pan_start is not None and event.buttons() & (QtCore.Qt.LeftButton | QtCore.Qt.MiddleButton):
+			self._offset = self._pan_offset + QPointF(event.pos() - self._pan_start)
+			self.update()
+			return
+
+		if self._press_vertex is None or not event.buttons() & QtCore.Qt.LeftButton:
+			return
+		if (event.pos() - self._press_pos).manhattanLength() < QtWidgets.QApplication.startDragDistance():
+			return
+
+		# The vertex is placed by hand from now on
+		self.stop_layout()
+		self._drag_vertex, self._press_vertex = self._press_vertex, None
+		mime_data = QtCore.QMimeData()
+		mime_data.setText(str(self._drag_vertex))
+		drag = QtGui.QDrag(self)
+		drag.setMimeData(mime_data)
+		drag.setPixmap(self._vertex_pixmap(self._drag_vertex))
+		drag.setHotSpot(QPoint(VertexWidget.vertex_size // 2, VertexWidget.vertex_size // 2))
+		self.update()
+
+		drag.exec_(QtCore.Qt.CopyAction | QtCore.Qt.MoveAction, QtCore.Qt.CopyAction)
+
+		self._drag_vertex = None
+		self.update()
+
+	def _vertex_pixmap(self, vertex: Vertex) -> QtGui.QPixmap:
+		size = VertexWidget.vertex_size
+		pixmap = QtGui.QPixmap(size + 1, size + 1)
+		pixmap.fill(QtCore.Qt.transparent)
+
+		qp = QtGui.QPainter()
+		qp.begin(pixmap)
+		qp.setPen(QtGui.QColor(255, 255, 255))
+		qp.setBrush(self._vert_widget_dict[vertex].get_color())
+		qp.drawEllipse(QPoint(size // 2, size // 2), size // 2, size // 2)
+		qp.end()
+		return pixmap
+
+	def dragEnterEvent(self, event):
+		if event.source() is self and event.mimeData().hasText():
+			event.setDropAction(QtCore.Qt.CopyAction)
+			event.accept()
+		else:
+			event.ignore()
+
+	def dragMoveEvent(self, event):
+		cell = self.cell_at(event.pos())
+		if cell is not None and cell not in self._cell_vert_dict:
+			event.accept()
+		else:
+			event.ignore()
+
+	def dropEvent(self, event):
+		cell = self.cell_at(event.pos())
+		if self._drag_vertex is None or cell is None or cell in self._cell_vert_dict:
+			event.ignore()
+			return
+
+		self.vertex_moved(self._drag_vertex, cell)
+		event.accept()
+
+	def vertex_moved(self, vertex: Vertex, cell: Tuple[int, int]) -> None:
+		if self._cell_vert_dict.get(self._vert_cell_dict[vertex]) is vertex:
+			del self._cell_vert_dict[self._vert_cell_dict[vertex]]
+		self._vert_cell_dict[vertex] = cell
+		self._cell_vert_dict[cell] = vertex
+		self._index_vertex(vertex)
+		self.invalidate_geometry()
+
+	# Editing the graph stops the layout, it only knows the graph it was started with
+	def add_vertex(self, vertex: Vertex, x: int, y: int) -> None:
+		self.stop_layout()
+		self._graph.append(vertex)
+		self._place(vertex, (x, y))
+		self.invalidate_geometry()
+
+	def add_connection(self, source: Vertex, destination: Vertex, weigh: int = 1) -> None:
+		self.stop_layout()
+		self._graph.connect(source, destination, weigh)
+
+	def remove_connection(self, source: Vertex, destination: Vertex) -> None:
+		self.stop_layout()
+		self._graph.disconnect(source, destination)
+
+	def set_weight(self, source: Vertex, destination: Vertex, weigh: int) -> None:
+		self.stop_layout()
+		self._graph.set_weight(source, destination, weigh)
+
+	def _edges_changed(self, changes: List[Tuple[Vertex, Vertex, Optional[float], Optional[float]]]) -> None:
+		self.invalidate_geometry()
+
+	def get_dict(self) -> Dict[Vertex, CanvasVertex]:
+		return self._vert_widget_dict
+
+	# Grid cell of every vertex {vertex: (row, column)}, e.g. for graphutils.grid_heuristic
+	def get_grid_positions(self) -> Dict[Vertex, Tuple[int, int]]:
+		return dict(self._vert_cell_dict)
+
+	def get_grid_cell(self, qpoint: QPoint) -> Optional[Tuple[int, int]]:
+		return self.cell_at(qpoint)
+
+	# Vertex shown at a point of the widget, None over an empty cell. The cell lookup is O(1).
+	def vertex_at(self, qpoint: QPoint) -> Vertex:
+		return self._cell_vert_dict.get(self.cell_at(qpoint))
+
+	def animate_select(self, vertex: Vertex) -> None:
+		center = self.map_from_scene(QPointF(self.get_cell_center(self._vert_cell_dict[vertex])))
+		self._animation = SelectAnimation(self, center)
+
+	# Widget rectangle a vertex and its label are painted in, the label may reach past the cell on the right
+	def _vertex_rect(self, vertex: Vertex, text: str) -> QtCore.QRect:
+		center = self.get_cell_center(self._vert_cell_dict[vertex])
+		radius = VertexWidget.vertex_size / 2 + 1
+		rect = QRectF(center.x() - radius, center.y() - radius, 2 * radius, 2 * radius)
+		if self._zoom >= GraphCanvas.label_zoom:
+			rect = rect.united(QRectF(center.x() - 4, rect.top(), self.fontMetrics().width(text) + 6, rect.height()))
+		return self.get_transform().mapRect(rect).toAlignedRect().adjusted(-1, -1, 1, 1)
+
+	# Repaint only the rectangles of the changed vertices.
+	# Past dirty_limit vertices one repaint of the whole widget is cheaper than merging the rectangles.
+	def _vertices_changed(self, dirty: Optional[Dict[Vertex, str]]) -> None:
+		if dirty is None or len(dirty) > GraphCanvas.dirty_limit:
+			self.update()
+			return
+
+		bounds = self.rect()
+		for vertex, text in dirty.items():
+			rect = self._vertex_rect(vertex, text)
+			if rect.intersects(bounds):
+				self.update(rect)
+
+	def _path_changed(self) -> None:
+		# Only the colors change, the geometry and the spatial index stay
+		self._edge_batch = None
+		self.update()
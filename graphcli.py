@@ -0,0 +1,158 @@
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+from collections import OrderedDict
+import argparse
+import json
+import math
+import sys
+import graphio
+from graphcsr import CompactGraph, trace_ids
+
+
+# Headless entry point: answers shortest path queries on a graph file and prints one JSON object per query.
+# It must never import PySide2, directly or through graphui, graphworker or vertexsystem, so it runs without a display
+# and starts in a fraction of the time of the GUI. The "startup" case of graphbench checks both.
+
+
+"""
+Answers point to point queries on a CompactGraph.
+The first query from a source runs a search that stops at its destination. A source asked again gets its whole
+shortest path tree computed and kept in a least recently used cache, so queries grouped by source cost one search
+per source. The cache holds as many trees as fit into max_bytes.
+"""
+class QueryEngine:
+	def __init__(self, compact: CompactGraph, paths: bool = False, max_bytes: int = 64 * 2 ** 20):
+		self._compact = compact
+		self._paths = paths
+		# Distances and predecessors of a tree take 8 + 4 or 8 bytes per vertex
+		self._capacity = max(1, max_bytes // (16 * max(len(compact), 1)))
+		self._trees = OrderedDict()
+		# Sources queried so far without a tree
+		self._seen = set()
+
+		self._queries = 0
+		self._searches = 0
+		self._tree_hits = 0
+
+	# Integer id of a vertex name. Graphs without names, e.g. binary edge lists, are queried by id.
+	def resolve(self, key: Any) -> int:
+		compact = self._compact
+		if compact.has_names():
+			return compact.id_of(str(key))
+
+		vert_id = int(key)
+		if not 0 <= vert_id < len(compact):
+			raise KeyError(key)
+		return vert_id
+
+	def _tree(self, source: int) -> Optional[Tuple[Any, Any]]:
+		tree = self._trees.get(source)
+		if tree is not None:
+			self._trees.move_to_end(source)
+			self._tree_hits += 1
+			return tree
+
+		if source not in self._seen:
+			self._seen.add(source)
+			return None
+
+		self._searches += 1
+		tree = self._compact.shortest_path_tree(source)
+		self._trees[source] = tree
+		if len(self._trees) > self._capacity:
+			self._trees.popitem(last=False)
+		return tree
+
+	def answer(self, source: Any, destination: Any) -> Dict[str, Any]:
+		self._queries += 1
+		result = {"source": source, "destination": destination}
+		ids = []
+		for key in (source, destination):
+			try:
+				ids.append(self.resolve(key))
+			except (KeyError, ValueError):
+				result["error"] = "unknown vertex: " + str(key)
+				return result
+		source_id, destination_id = ids
+
+		tree = self._tree(source_id)
+		if tree is None:
+			self._searches += 1
+			distance, path = self._compact.distance_and_path(source_id, destination_id)
+		else:
+			distance = float(tree[0][destination_id])
+			path = trace_ids(tree[1], source_id, destination_id) if self._paths and distance < math.inf else []
+
+		# JSON has no infinity, unreachable destinations get null
+		result["distance"] = distance if distance < math.inf else None
+		if self._paths:
+			result["path"] = [self._compact.get_name(vert_id) for vert_id in path]
+		return result
+
+	def get_stats(self) -> Dict[str, int]:
+		return {"queries": self._queries, "searches": self._searches, "tree_hits": self._tree_hits}
+
+
+# Queries are "source destination" lines or JSON objects {"source": ..., "destination": ...}.
+# Empty lines and lines starting with "#" are skipped, a line that is neither form is reported as an error.
+def parse_queries(lines: TextIO) -> Iterator[Tuple[Any, Any, Optional[str]]]:
+	for line in lines:
+		line = line.strip()
+		if not line or line.startswith("#"):
+			continue
+
+		if line.startswith("{"):
+			try:
+				query = json.loads(line)
+				yield query["source"], query["destination"], None
+			except (ValueError, KeyError, TypeError):
+				yield None, None, "malformed query: " + line
+			continue
+
+		fields = line.split()
+		if len(fields) != 2:
+			yield None, None, "malformed query: " + line
+			continue
+		yield fields[0], fields[1], None
+
+
+# Answer every query of the input, returns the number of queries that failed
+def run_queries(engine: QueryEngine, queries: TextIO, output: TextIO, flush: bool = False) -> int:
+	failed = 0
+	for source, destination, error in parse_queries(queries):
+		result = {"error": error} if error is not None else engine.answer(source, destination)
+		failed += "error" in result
+
+		output.write(json.dumps(result) + "\n")
+		# A process feeding queries one at a time waits for every answer
+		if flush:
+			output.flush()
+
+	return failed
+
+
+def main(argv: List[str] = None) -> int:
+	parser = argparse.ArgumentParser(description="Answer shortest path queries on a graph file, one JSON line each")
+	parser.add_argument("graph", help="snapshot (.qtgs), binary edge list or text edge list")
+	parser.add_argument("--queries", default="-", help="file of queries, standard input by default")
+	parser.add_argument("--directed", action="store_true", help="edge lists hold directed edges")
+	parser.add_argument("--paths", action="store_true", help="add the vertices of every shortest path")
+	parser.add_argument("--no-verify", action="store_true", help="skip the checksums of a snapshot")
+	parser.add_argument("--stats", action="store_true", help="print the search counts to standard error")
+	args = parser.parse_args(argv)
+
+	compact = graphio.load_graph(args.graph, args.directed, not args.no_verify)
+	engine = QueryEngine(compact, args.paths)
+
+	if args.queries == "-":
+		failed = run_queries(engine, sys.stdin, sys.stdout, flush=True)
+	else:
+		with open(args.queries) as queries:
+			failed = run_queries(engine, queries, sys.stdout)
+
+	if args.stats:
+		print(json.dumps(engine.get_stats()), file=sys.stderr)
+	return 1 if failed else 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,166 @@
+from typing import List, Tuple, Any
+import heapq
+import math
+import numpy as np
+from graphutils import Graph, Vertex
+
+
+"""
+Frozen compressed sparse row copy of a Graph with integer vertex ids.
+Edges of vertex i are targets[offsets[i]:offsets[i + 1]] with the matching weights, so an edge costs
+one index and one weight instead of the dict entry, list slot and tuple of the mutable Vertex.
+"""
+class CompactGraph:
+	def __init__(self, offsets: np.ndarray, targets: np.ndarray, weights: np.ndarray, names: List[str] = None,
+				 vertices: List[Vertex] = None):
+		self._offsets = offsets
+		self._targets = targets
+		self._weights = weights
+		# Vertex names, None when vertices are only known by their ids
+		self._names = names
+		# Vertex objects of the Graph this was built from, None for graphs without one
+		self._vertices = vertices
+		self._index = None
+
+	def __len__(self):
+		return len(self._offsets) - 1
+
+	def edge_count(self) -> int:
+		return len(self._targets)
+
+	def get_offsets(self) -> np.ndarray:
+		return self._offsets
+
+	def get_targets(self) -> np.ndarray:
+		return self._targets
+
+	def get_weights(self) -> np.ndarray:
+		return self._weights
+
+	def has_names(self) -> bool:
+		return self._names is not None
+
+	def get_name(self, vert_id: int) -> str:
+		return self._names[vert_id] if self._names is not None else str(vert_id)
+
+	def get_vertex(self, vert_id: int) -> Vertex:
+		return self._vertices[vert_id] if self._vertices is not None else None
+
+	# Resolve an integer id, a Vertex of the source Graph or a vertex name to an integer id
+	def id_of(self, key: Any) -> int:
+		if isinstance(key, (int, np.integer)):
+			return int(key)
+
+		if self._index is None:
+			self._index = {name: i for i, name in enumerate(self._names or [])}
+			if self._vertices is not None:
+				self._index.update({vert: i for i, vert in enumerate(self._vertices)})
+
+		return self._index[key]
+
+	def neighbors(self, vert_id: int) -> Tuple[np.ndarray, np.ndarray]:
+		lo, hi = self._offsets[vert_id], self._offsets[vert_id + 1]
+		return self._targets[lo:hi], self._weights[lo:hi]
+
+	# Dijkstra over the arrays, returns distance and predecessor lists. With a destination,
+	# the search stops once it is settled and only the values of settled vertices are final.
+	def _search(self, source: int, destination: int = -1) -> Tuple[List[float], List[int]]:
+		offsets, targets, weights = self._offsets, self._targets, self._weights
+
+		distance = [math.inf] * len(self)
+		distance[source] = 0
+		predecessor = [-1] * len(self)
+		# Integer ids break ties deterministically
+		queue = [(0, source)]
+
+		while queue:
+			dist, vert = heapq.heappop(queue)
+			if dist > distance[vert]:
+				continue
+			if vert == destination:
+				break
+
+			lo, hi = offsets[vert], offsets[vert + 1]
+			for neighbor, weigh in zip(targets[lo:hi].tolist(), weights[lo:hi].tolist()):
+				if dist + weigh < distance[neighbor]:
+					distance[neighbor] = dist + weigh
+					predecessor[neighbor] = vert
+					heapq.heappush(queue, (dist + weigh, neighbor))
+
+		return distance, predecessor
+
+	def distances(self, source: Any, destination: Any = None) -> np.ndarray:
+		destination = self.id_of(destination) if destination is not None else -1
+		return np.array(self._search(self.id_of(source), destination)[0], dtype=np.float64)
+
+	# Distances and predecessor ids (-1 for the source and unreachable vertices)
+	def shortest_path_tree(self, source: Any) -> Tuple[np.ndarray, np.ndarray]:
+		distance, predecessor = self._search(self.id_of(source))
+		return np.array(distance, dtype=np.float64), np.array(predecessor, dtype=self._targets.dtype)
+
+	def dijkstra(self, source: Any, destination: Any) -> float:
+		destination = self.id_of(destination)
+		return float(self._search(self.id_of(source), destination)[0][destination])
+
+	# Vertex ids on a shortest path, empty when the destination is unreachable
+	def shortest_path(self, source: Any, destination: Any) -> List[int]:
+		source, destination = self.id_of(source), self.id_of(destination)
+		distance, predecessor = self._search(source, destination)
+		return trace_ids(predecessor, source, destination) if distance[destination] < math.inf else []
+
+	# Distance and vertex ids of a shortest path found by one search, (inf, []) when the destination is unreachable
+	def distance_and_path(self, source: Any, destination: Any) -> Tuple[float, List[int]]:
+		source, destination = self.id_of(source), self.id_of(destination)
+		distance, predecessor = self._search(source, destination)
+		if distance[destination] == math.inf:
+			return math.inf, []
+		return float(distance[destination]), trace_ids(predecessor, source, destination)
+
+	# Mutable Graph with a new Vertex per id, e.g. to show a loaded graph in GraphWidget
+	def to_graph(self) -> Tuple[Graph, List[Vertex]]:
+		vertices = [Vertex(self.get_name(i)) for i in range(len(self))]
+		graph = Graph(*vertices)
+
+		weights = self._weights
+		if np.array_equal(weights, np.round(weights)):
+			weights = weights.astype(np.int64)
+		targets, weights = self._targets.tolist(), weights.tolist()
+
+		# Both directions of every edge are already stored, so connect the vertices one way at a time
+		for i, vert in enumerate(vertices):
+			for j in range(self._offsets[i], self._offsets[i + 1]):
+				vert.connect(vertices[targets[j]], weights[j])
+
+		return graph, vertices
+
+	def nbytes(self) -> int:
+		return self._offsets.nbytes + self._targets.nbytes + self._weights.nbytes
+
+	def bytes_per_edge(self) -> float:
+		return self.nbytes() / max(self.edge_count(), 1)
+
+
+def trace_ids(predecessor: Any, source: int, destination: int) -> List[int]:
+	path = [destination]
+	while path[-1] != source:
+		path.append(int(predecessor[path[-1]]))
+
+	path.reverse()
+	return path
+
+
+def from_graph(graph: Graph, dtype: Any = np.float64) -> CompactGraph:
+	if np.dtype(dtype) not in (np.float32, np.float64):
+		raise ValueError("weights must be float32 or float64")
+
+	vertices = list(graph)
+	index = {vert: i for i, vert in enumerate(vertices)}
+	edges = sum(len(vert.keys()) for vert in vertices)
+	id_dtype = np.int32 if len(vertices) < 2 ** 31 else np.int64
+
+	offsets = np.zeros(len(vertices) + 1, dtype=np.int64)
+	offsets[1:] = np.cumsum(np.fromiter((len(vert.keys()) for vert in vertices), dtype=np.int64, count=len(vertices)))
+	targets = np.fromiter((index[neighbor] for vert in vertices for neighbor, _ in vert), dtype=id_dtype, count=edges)
+	weights = np.fromiter((weigh for vert in vertices for _, weigh in vert), dtype=dtype, count=edges)
+
+	return CompactGraph(offsets, targets, weights, [str(vert) for vert in vertices], vertices)
@@ -0,0 +1,305 @@
+from typing import List, Tuple, Dict, Any, Optional
+import io
+import mmap
+import os
+import struct
+import warnings
+import zlib
+import numpy as np
+from graphcsr import CompactGraph, from_graph
+from graphutils import Graph
+
+
+# Binary edge list: header (magic, version, edge count) followed by packed records
+EDGE_MAGIC = b"QTGE"
+EDGE_VERSION = 1
+EDGE_HEADER = struct.Struct("<4sIQ")
+EDGE_RECORD = np.dtype([("source", "<u4"), ("target", "<u4"), ("weight", "<f8")])
+
+
+"""
+Collects edge chunks as arrays and turns them into a CompactGraph.
+Vertex names are mapped to ids once per distinct name in a chunk, never once per edge.
+"""
+class EdgeChunks:
+	def __init__(self, directed: bool, dtype: Any):
+		self._directed = directed
+		self._dtype = np.dtype(dtype)
+		self._index = {}
+		self._vertex_count = 0
+		self._chunks = []
+
+	def add_names(self, sources: np.ndarray, targets: np.ndarray, weights: np.ndarray) -> None:
+		names, inverse = np.unique(np.concatenate((sources, targets)), return_inverse=True)
+		ids = np.fromiter((self._index.setdefault(name, len(self._index)) for name in names.tolist()),
+						  dtype=np.int64, count=len(names))
+		ids = ids[inverse]
+		self._vertex_count = len(self._index)
+		self.add_ids(ids[:len(sources)], ids[len(sources):], weights)
+
+	def add_ids(self, sources: np.ndarray, targets: np.ndarray, weights: np.ndarray) -> None:
+		if len(sources) == 0:
+			return
+
+		self._vertex_count = max(self._vertex_count, int(sources.max()) + 1, int(targets.max()) + 1)
+		if not self._directed:
+			sources, targets = np.concatenate((sources, targets)), np.concatenate((targets, sources))
+			weights = np.concatenate((weights, weights))
+
+		self._chunks.append((sources.astype(np.int32), targets.astype(np.int32), weights.astype(self._dtype)))
+
+	def get_names(self) -> List[str]:
+		return list(self._index) if self._index else None
+
+	# Place every chunk straight into the CSR arrays, without concatenating all edges first
+	def build(self, names: List[str] = None) -> CompactGraph:
+		count = self._vertex_count
+		degrees = np.zeros(count, dtype=np.int64)
+		for sources, _, _ in self._chunks:
+			degrees += np.bincount(sources, minlength=count)
+
+		offsets = np.zeros(count + 1, dtype=np.int64)
+		np.cumsum(degrees, out=offsets[1:])
+		targets = np.empty(offsets[-1], dtype=np.int32)
+		weights = np.empty(offsets[-1], dtype=self._dtype)
+		fill = offsets[:-1].copy()
+
+		while self._chunks:
+			sources, chunk_targets, chunk_weights = self._chunks.pop(0)
+			order = np.argsort(sources, kind="stable")
+			sources = sources[order]
+
+			# Rank of every edge among the edges of its source vertex within this chunk
+			starts = np.flatnonzero(np.r_[True, sources[1:] != sources[:-1]])
+			rank = np.arange(len(sources)) - np.repeat(starts, np.diff(np.r_[starts, len(sources)]))
+			positions = fill[sources] + rank
+
+			targets[positions] = chunk_targets[order]
+			weights[positions] = chunk_weights[order]
+			fill += np.bincount(sources, minlength=count)
+
+		return CompactGraph(offsets, targets, weights, names if names is not None else self.get_names())
+
+
+def _delimiter(path: str) -> str:
+	extension = os.path.splitext(path)[1].lower()
+	return {".csv": ",", ".tsv": "\t"}.get(extension)
+
+
+# Stream a text edge list with "source target [weigh]" rows, weighs default to 1.
+# The delimiter is picked from the extension (.csv, .tsv) and defaults to whitespace, "#" starts a comment.
+# Undirected lists store every edge in both directions, like Graph.connect.
+def load_edge_list(path: str, delimiter: str = None, directed: bool = False, dtype: Any = np.float64,
+				   chunk_bytes: int = 4 * 2 ** 20) -> CompactGraph:
+	delimiter = delimiter if delimiter is not None else _delimiter(path)
+	chunks = EdgeChunks(directed, dtype)
+	rest = b""
+
+	with open(path, "rb") as f:
+		while True:
+			data = f.read(chunk_bytes)
+			block = rest + data
+			end = block.rfind(b"\n") + 1 if data else len(block)
+			rest = block[end:]
+
+			text = block[:end].decode("utf-8")
+			if text.strip():
+				with warnings.catch_warnings():
+					# Comment only lines are reported as empty rows
+					warnings.simplefilter("ignore", UserWarning)
+					rows = np.loadtxt(io.StringIO(text), dtype=str, delimiter=delimiter, comments="#", ndmin=2)
+				if len(rows) > 0:
+					weights = rows[:, 2].astype(np.float64) if rows.shape[1] > 2 else np.ones(len(rows))
+					chunks.add_names(rows[:, 0], rows[:, 1], weights)
+
+			if not data:
+				break
+
+	return chunks.build()
+
+
+def save_binary_edges(path: str, sources: np.ndarray, targets: np.ndarray, weights: np.ndarray) -> None:
+	records = np.empty(len(sources), dtype=EDGE_RECORD)
+	records["source"], records["target"], records["weight"] = sources, targets, weights
+
+	with open(path, "wb") as f:
+		f.write(EDGE_HEADER.pack(EDGE_MAGIC, EDGE_VERSION, len(records)))
+		records.tofile(f)
+
+
+# Stream a binary edge list written by save_binary_edges, vertices are named by their ids
+def load_binary_edges(path: str, directed: bool = False, dtype: Any = np.float64,
+					  chunk_edges: int = 2 ** 20) -> CompactGraph:
+	chunks = EdgeChunks(directed, dtype)
+
+	with open(path, "rb") as f:
+		magic, version, count = EDGE_HEADER.unpack(f.read(EDGE_HEADER.size))
+		if magic != EDGE_MAGIC or version != EDGE_VERSION:
+			raise ValueError("not a binary edge list: " + path)
+
+		while count > 0:
+			records = np.fromfile(f, dtype=EDGE_RECORD, count=min(chunk_edges, count))
+			if len(records) == 0:
+				raise ValueError("truncated binary edge list: " + path)
+
+			chunks.add_ids(records["source"], records["target"], records["weight"])
+			count -= len(records)
+
+	return chunks.build()
+
+
+# Snapshot: header, section table and header checksum, followed by 64 byte aligned sections
+SNAPSHOT_MAGIC = b"QTGS"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<4sIIIQQ")
+SNAPSHOT_SECTION = struct.Struct("<QQI4x")
+SNAPSHOT_SECTIONS = ("offsets", "targets", "weights", "name_offsets", "name_data", "positions")
+SNAPSHOT_ALIGN = 64
+SNAPSHOT_HAS_NAMES = 1
+SNAPSHOT_HAS_POSITIONS = 2
+
+
+"""
+Vertex names stored as UTF-8 data with offsets, decoded only when a name is read.
+"""
+class NameTable:
+	def __init__(self, offsets: np.ndarray, data: memoryview):
+		self._offsets = offsets
+		self._data = data
+
+	def __len__(self):
+		return len(self._offsets) - 1
+
+	def __getitem__(self, index: int) -> str:
+		return bytes(self._data[self._offsets[index]:self._offsets[index + 1]]).decode("utf-8")
+
+	def __iter__(self):
+		return (self[i] for i in range(len(self)))
+
+
+"""
+Graph opened from a snapshot file. The arrays are views of the memory mapped file.
+"""
+class Snapshot:
+	def __init__(self, graph: CompactGraph, positions: Optional[np.ndarray], mapping: mmap.mmap):
+		self._graph = graph
+		self._positions = positions
+		self._mmap = mapping
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	def get_graph(self) -> CompactGraph:
+		return self._graph
+
+	# Grid cell (row, column) of every vertex id, -1 for vertices without one, None if none were saved
+	def get_positions(self) -> Optional[np.ndarray]:
+		return self._positions
+
+	def close(self) -> None:
+		# The mapping stays open while arrays still refer to it and is released with them
+		self._graph = None
+		self._positions = None
+		self._mmap = None
+
+
+def _aligned(position: int) -> int:
+	return (position + SNAPSHOT_ALIGN - 1) // SNAPSHOT_ALIGN * SNAPSHOT_ALIGN
+
+
+# Save a Graph or CompactGraph, positions {vertex or vertex id: (row, column)} are optional
+def save_snapshot(path: str, graph: Any, positions: Dict[Any, Tuple[int, int]] = None) -> None:
+	compact = from_graph(graph) if isinstance(graph, Graph) else graph
+	count = len(compact)
+
+	names = [compact.get_name(i).encode("utf-8") for i in range(count)]
+	name_offsets = np.zeros(count + 1, dtype=np.int64)
+	np.cumsum([len(name) for name in names], out=name_offsets[1:])
+
+	cells = np.full((count, 2), -1, dtype=np.int32)
+	for key, cell in (positions or {}).items():
+		cells[compact.id_of(key)] = cell
+
+	sections = [compact.get_offsets().astype("<i8"), compact.get_targets().astype("<i4"),
+				compact.get_weights().astype(compact.get_weights().dtype.newbyteorder("<")),
+				name_offsets.astype("<i8"), b"".join(names), cells if positions is not None else b""]
+	flags = SNAPSHOT_HAS_NAMES | (SNAPSHOT_HAS_POSITIONS if positions is not None else 0)
+
+	table = []
+	position = _aligned(SNAPSHOT_HEADER.size + SNAPSHOT_SECTION.size * len(sections) + 4)
+	for section in sections:
+		data = memoryview(section).cast("B")
+		table.append((position, len(data), zlib.crc32(data)))
+		position = _aligned(position + len(data))
+
+	header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, flags, compact.get_weights().itemsize,
+								  count, compact.edge_count())
+	header += b"".join(SNAPSHOT_SECTION.pack(*entry) for entry in table)
+	header += struct.pack("<I", zlib.crc32(header))
+
+	with open(path, "wb") as f:
+		f.write(header)
+		for (start, _, _), section in zip(table, sections):
+			f.seek(start)
+			f.write(memoryview(section).cast("B"))
+		f.truncate(position)
+
+
+# Open a snapshot without parsing it: the arrays are zero copy views of the memory mapped file.
+# The header is always checked, verify also checks the checksum of every section, which reads the whole file.
+def open_snapshot(path: str, verify: bool = True) -> Snapshot:
+	with open(path, "rb") as f:
+		mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+	header_size = SNAPSHOT_HEADER.size + SNAPSHOT_SECTION.size * len(SNAPSHOT_SECTIONS)
+	if len(mapping) < header_size + 4:
+		raise ValueError("truncated snapshot: " + path)
+
+	magic, version, flags, weight_size, count, edges = SNAPSHOT_HEADER.unpack_from(mapping)
+	if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+		raise ValueError("not a graph snapshot: " + path)
+	if struct.unpack_from("<I", mapping, header_size)[0] != zlib.crc32(mapping[:header_size]):
+		raise ValueError("corrupt snapshot header: " + path)
+
+	views = {}
+	for i, name in enumerate(SNAPSHOT_SECTIONS):
+		start, length, checksum = SNAPSHOT_SECTION.unpack_from(mapping, SNAPSHOT_HEADER.size + i * SNAPSHOT_SECTION.size)
+		if start + length > len(mapping):
+			raise ValueError("truncated snapshot: " + path)
+
+		views[name] = memoryview(mapping)[start:start + length]
+		if verify and zlib.crc32(views[name]) != checksum:
+			raise ValueError("corrupt snapshot section " + name + ": " + path)
+
+	weight_dtype = {4: "<f4", 8: "<f8"}[weight_size]
+	offsets = np.frombuffer(views["offsets"], dtype="<i8", count=count + 1)
+	targets = np.frombuffer(views["targets"], dtype="<i4", count=edges)
+	weights = np.frombuffer(views["weights"], dtype=weight_dtype, count=edges)
+
+	names = None
+	if flags & SNAPSHOT_HAS_NAMES:
+		names = NameTable(np.frombuffer(views["name_offsets"], dtype="<i8", count=count + 1), views["name_data"])
+
+	positions = None
+	if flags & SNAPSHOT_HAS_POSITIONS:
+		positions = np.frombuffer(views["positions"], dtype="<i4", count=2 * count).reshape(count, 2)
+
+	return Snapshot(CompactGraph(offsets, targets, weights, names), positions, mapping)
+
+
+# Load a snapshot, a binary edge list or a text edge list, told apart by the magic at the start of the file
+def load_graph(path: str, directed: bool = False, verify: bool = True) -> CompactGraph:
+	with open(path, "rb") as f:
+		magic = f.read(4)
+
+	if magic == SNAPSHOT_MAGIC:
+		# The arrays keep the mapping open after the snapshot is closed
+		with open_snapshot(path, verify) as snapshot:
+			return snapshot.get_graph()
+	elif magic == EDGE_MAGIC:
+		return load_binary_edges(path, directed)
+
+	return load_edge_list(path, directed=directed)
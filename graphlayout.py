@@ -0,0 +1,278 @@
+from typing import Dict, Tuple, Any, Optional
+import math
+import numpy as np
+from graphcsr import CompactGraph
+from graphutils import Graph, Vertex
+
+
+"""
+Fruchterman-Reingold force directed layout computed with NumPy.
+Repulsion uses a Barnes-Hut style approximation over a hierarchy of uniform grids: at every level the cell of a
+vertex is pushed by the centres of mass of the well separated cells next to its parent cell, and only vertices in
+the neighbouring cells of the finest level are summed exactly. An iteration is O(V log V + E).
+The layout advances in steps, so a window can spread it over several frames.
+"""
+class ForceLayout:
+	# Cells at the finest level of the hierarchy hold about this many vertices
+	leaf_size = 2
+	# Distance in cells up to which snap looks for a free cell next to the one a vertex falls into
+	snap_radius = 8
+	# Share of the vertices on each side which may lie outside of the range scaled to the grid
+	snap_outliers = 0.02
+
+	def __init__(self, graph: Any, iterations: int = 100, seed: int = 0, positions: np.ndarray = None,
+				 pinned: np.ndarray = None, gravity: float = 0.05):
+		compact = graph.compact() if isinstance(graph, Graph) else graph
+		count = len(compact)
+
+		self._compact = compact
+		# An empty graph has nothing to lay out
+		self._iterations = iterations if count else 0
+		self._iteration = 0
+		self._gravity = gravity
+		self._sources = np.repeat(np.arange(count), np.diff(compact.get_offsets()))
+		self._targets = compact.get_targets().astype(np.int64)
+
+		# The ideal edge length is 1, so the whole layout spans about sqrt(V) units
+		rng = np.random.default_rng(seed)
+		self._positions = rng.random((count, 2)) * math.sqrt(max(count, 1))
+		if positions is not None:
+			self._positions[:] = positions
+		# Vertices which keep their position, e.g. the ones with a saved grid cell
+		self._pinned = pinned if pinned is not None else np.zeros(count, dtype=bool)
+		self._start_temperature = 0.1 * math.sqrt(max(count, 1)) + 1
+
+	def __len__(self):
+		return len(self._positions)
+
+	def is_done(self) -> bool:
+		return self._iteration >= self._iterations
+
+	def get_iteration(self) -> int:
+		return self._iteration
+
+	def get_iterations(self) -> int:
+		return self._iterations
+
+	def get_positions(self) -> np.ndarray:
+		return self._positions
+
+	def get_compact(self) -> CompactGraph:
+		return self._compact
+
+	# Run up to the given number of iterations, returns False once the layout is finished
+	def step(self, iterations: int = 1) -> bool:
+		for _ in range(min(iterations, self._iterations - self._iteration)):
+			# Linear cooling, the last iterations only make small corrections
+			temperature = self._start_temperature * (1 - self._iteration / self._iterations)
+			displacement = self._repulsion() + self._attraction()
+			displacement -= self._gravity * (self._positions - self._positions.mean(axis=0))
+
+			length = np.maximum(np.hypot(displacement[:, 0], displacement[:, 1]), 1e-9)
+			displacement *= (np.minimum(length, temperature) / length)[:, None]
+			displacement[self._pinned] = 0
+			self._positions += displacement
+			self._iteration += 1
+
+		return not self.is_done()
+
+	def _attraction(self) -> np.ndarray:
+		count = len(self._positions)
+		delta = self._positions[self._targets] - self._positions[self._sources]
+		# Both directions of every edge are stored, so every endpoint is pulled once by d^2 / k
+		delta *= np.hypot(delta[:, 0], delta[:, 1])[:, None]
+
+		return np.stack((np.bincount(self._sources, delta[:, 0], minlength=count),
+						 np.bincount(self._sources, delta[:, 1], minlength=count)), axis=1)
+
+	# Forces are summed as complex numbers x + iy, where the push k^2 / d along delta is 1 / conj(delta)
+	def _repulsion(self) -> np.ndarray:
+		positions = self._positions
+		count = len(positions)
+		if count < 2:
+			return np.zeros((count, 2))
+
+		points = positions[:, 0] + 1j * positions[:, 1]
+		force = np.zeros(count, dtype=np.complex128)
+		levels = max(1, math.ceil(math.log(max(count / ForceLayout.leaf_size, 1), 4)))
+		side = 2 ** levels
+		low = positions.min(axis=0)
+		span = max(float(np.ptp(positions, axis=0).max()), 1e-9) * (1 + 1e-9)
+		finest = np.minimum(((positions - low) / span * side).astype(np.int64), side - 1)
+
+		# Far field: centres of mass of the cells that are well separated at their level. The field is evaluated once
+		# per occupied cell, at its own centre of mass, and shared by the vertices in it. The grid of every level
+		# is padded by three empty cells on each side, so offsets never need a bounds check, and empty cells are
+		# moved far away, so they add nothing.
+		for level in range(2, levels + 1):
+			cells = finest >> (levels - level)
+			padded_side = 2 ** level + 6
+			cell_ids = (cells[:, 0] + 3) * padded_side + cells[:, 1] + 3
+			mass = np.bincount(cell_ids, minlength=padded_side ** 2).astype(np.float64)
+			center = (np.bincount(cell_ids, positions[:, 0], minlength=padded_side ** 2) +
+					  1j * np.bincount(cell_ids, positions[:, 1], minlength=padded_side ** 2))
+			center /= np.maximum(mass, 1)
+			center[mass == 0] = 1e12
+
+			occupied = np.flatnonzero(mass)
+			field = np.zeros(padded_side ** 2, dtype=np.complex128)
+			# The interaction list depends on where a cell lies within its parent
+			parity = ((occupied // padded_side - 3) & 1) * 2 + ((occupied % padded_side - 3) & 1)
+			for corner, offsets in enumerate(ForceLayout._interaction_offsets(padded_side)):
+				own = occupied[parity == corner]
+				other = own[:, None] + offsets[None, :]
+				field[own] = (mass[other] / np.conj(center[own, None] - center[other])).sum(axis=1)
+
+			force += field[cell_ids]
+
+		# Near field: every pair of vertices in neighbouring cells of the finest level.
+		# Half of the neighbourhood is enough, as every pair pushes both of its vertices.
+		cell_ids = finest[:, 0] * side + finest[:, 1]
+		order = np.argsort(cell_ids, kind="stable")
+		starts = np.searchsorted(cell_ids[order], np.arange(side ** 2 + 1))
+
+		for dx, dy in ((0, 0), (0, 1), (1, -1), (1, 0), (1, 1)):
+			other = finest + (dx, dy)
+			index = np.flatnonzero(((other >= 0) & (other < side)).all(axis=1))
+			other_ids = other[index, 0] * side + other[index, 1]
+			counts = starts[other_ids + 1] - starts[other_ids]
+
+			first = np.repeat(index, counts)
+			within = np.arange(len(first)) - np.repeat(np.cumsum(counts) - counts, counts)
+			second = order[np.repeat(starts[other_ids], counts) + within]
+			# Within a cell every pair shows up in both orders, keep one of them
+			keep = first < second if dx == 0 and dy == 0 else first != second
+			first, second = first[keep], second[keep]
+
+			delta = points[first] - points[second]
+			# (Nearly) coincident vertices are pushed apart in a direction picked by their ids
+			close = np.abs(delta) < 1e-3
+			delta[close] = 1e-3 * np.exp(1j * first[close])
+			push = 1 / np.conj(delta)
+
+			force += (np.bincount(first, push.real, minlength=count) - np.bincount(second, push.real, minlength=count) +
+					  1j * (np.bincount(first, push.imag, minlength=count) - np.bincount(second, push.imag, minlength=count)))
+
+		return np.stack((force.real, force.imag), axis=1)
+
+	# Id offsets of the children of the cells next to the parent which are not next to the cell itself,
+	# for each of the four positions (row parity * 2 + column parity) of a cell within its parent
+	@staticmethod
+	def _interaction_offsets(side: int) -> list:
+		offsets = []
+		for row_parity in (0, 1):
+			for column_parity in (0, 1):
+				offsets.append(np.array([dx * side + dy
+										 for dx in range(-2 - row_parity, 4 - row_parity)
+										 for dy in range(-2 - column_parity, 4 - column_parity)
+										 if abs(dx) > 1 or abs(dy) > 1]))
+		return offsets
+
+	# Grid cell (row, column) of every vertex. The layout is scaled to the grid, then every vertex that shares a cell
+	# moves to the nearest free one. Cells of pinned vertices are given by fixed_cells, -1 rows are ignored.
+	def snap(self, width: int, height: int, fixed_cells: np.ndarray = None) -> np.ndarray:
+		count = len(self._positions)
+		if count > width * height:
+			raise ValueError("%d vertices do not fit into a %dx%d grid" % (count, width, height))
+
+		positions = self._positions
+		# A few outlying vertices would squeeze all others together, they are put on the border instead
+		low, high = np.quantile(positions, (ForceLayout.snap_outliers, 1 - ForceLayout.snap_outliers), axis=0) \
+			if count else (np.zeros(2), np.ones(2))
+		span = np.maximum(high - low, 1e-9)
+		# Keep a free border of one cell where the grid allows it
+		margin = (1 if width > 2 else 0, 1 if height > 2 else 0)
+		scale = (max(width - 1 - 2 * margin[0], 0), max(height - 1 - 2 * margin[1], 0))
+
+		cells = np.empty((count, 2), dtype=np.int64)
+		cells[:, 0] = np.rint(np.clip((positions[:, 1] - low[1]) / span[1], 0, 1) * scale[1]) + margin[1]
+		cells[:, 1] = np.rint(np.clip((positions[:, 0] - low[0]) / span[0], 0, 1) * scale[0]) + margin[0]
+
+		occupied = np.zeros((height, width), dtype=bool)
+		placed = np.zeros(count, dtype=bool)
+		if fixed_cells is not None:
+			fixed = self._pinned & (fixed_cells[:, 0] >= 0)
+			cells[fixed] = fixed_cells[fixed]
+			occupied[cells[fixed, 0], cells[fixed, 1]] = True
+			placed |= fixed
+
+		# The vertices left over look for a free cell in growing square rings around their own one, nearest first.
+		# When several of them want the same cell the nearest one gets it and the others try again a few times
+		# before they move on to the next ring.
+		for radius in range(min(max(width, height), ForceLayout.snap_radius + 1)):
+			offsets, distance = _ring_offsets(radius)
+			for _ in range(3):
+				free = np.flatnonzero(~placed)
+				if len(free) == 0:
+					return cells
+
+				wanted = cells[free, None, :] + offsets[None, :, :]
+				available = (wanted[:, :, 0] >= 0) & (wanted[:, :, 0] < height) & (wanted[:, :, 1] >= 0) & (wanted[:, :, 1] < width)
+				available[available] = ~occupied[wanted[available][:, 0], wanted[available][:, 1]]
+				found = np.flatnonzero(available.any(axis=1))
+				if len(found) == 0:
+					break
+
+				nearest = available[found].argmax(axis=1)
+				free, wanted, distance_to = free[found], wanted[found, nearest], distance[nearest]
+				wanted_ids = wanted[:, 0] * width + wanted[:, 1]
+				order = np.lexsort((distance_to, wanted_ids))
+				_, first = np.unique(wanted_ids[order], return_index=True)
+				winners = order[first]
+
+				cells[free[winners]] = wanted[winners]
+				occupied[wanted[winners, 0], wanted[winners, 1]] = True
+				placed[free[winners]] = True
+
+		# Crowded grids leave some vertices without a free cell nearby, they fill the remaining cells in reading order
+		free = np.flatnonzero(~placed)
+		free = free[np.lexsort((cells[free, 1], cells[free, 0]))]
+		cells[free] = np.argwhere(~occupied)[:len(free)]
+		return cells
+
+	# Snapped cells of the vertices of the Graph the layout was made for {vertex: (row, column)}
+	def cells(self, width: int, height: int, fixed_cells: np.ndarray = None) -> Dict[Vertex, Tuple[int, int]]:
+		cells = self.snap(width, height, fixed_cells).tolist()
+		return {self._compact.get_vertex(i): (row, column) for i, (row, column) in enumerate(cells)}
+
+
+# Offsets (row, column) of the square ring of cells at the given Chebyshev distance and their Euclidean distances,
+# nearest first
+def _ring_offsets(radius: int) -> Tuple[np.ndarray, np.ndarray]:
+	span = np.arange(-radius, radius + 1)
+	rows, columns = np.meshgrid(span, span, indexing="ij")
+	offsets = np.stack((rows.ravel(), columns.ravel()), axis=1)
+	offsets = offsets[np.abs(offsets).max(axis=1) == radius]
+	distance = np.hypot(offsets[:, 0], offsets[:, 1])
+	order = np.argsort(distance, kind="stable")
+	return offsets[order], distance[order]
+
+
+# Lay out a graph on a width x height grid in one go, returns {vertex: (row, column)}.
+# Vertices with a cell in positions keep it and the others are placed around them.
+def layout_cells(graph: Graph, width: int, height: int, iterations: int = 100, seed: int = 0,
+				 positions: Dict[Vertex, Tuple[int, int]] = None) -> Dict[Vertex, Tuple[int, int]]:
+	layout, fixed_cells = make_layout(graph, width, height, iterations, seed, positions)
+	layout.step(iterations)
+	return layout.cells(width, height, fixed_cells)
+
+
+# Layout of a graph together with the cells of its pinned vertices, -1 for the others, for ForceLayout.snap
+def make_layout(graph: Graph, width: int, height: int, iterations: int = 100, seed: int = 0,
+				positions: Dict[Vertex, Tuple[int, int]] = None) -> Tuple[ForceLayout, Optional[np.ndarray]]:
+	compact = graph.compact()
+	if not positions:
+		return ForceLayout(compact, iterations, seed), None
+
+	fixed_cells = np.full((len(compact), 2), -1, dtype=np.int64)
+	for vert, cell in positions.items():
+		if vert in graph:
+			fixed_cells[compact.id_of(vert)] = cell
+	pinned = fixed_cells[:, 0] >= 0
+
+	# Pinned vertices start at their cell, scaled like the random start of the others
+	scale = math.sqrt(max(len(compact), 1)) / max(width, height, 1)
+	start = np.random.default_rng(seed).random((len(compact), 2)) * math.sqrt(max(len(compact), 1))
+	start[pinned] = fixed_cells[pinned][:, ::-1] * scale
+
+	return ForceLayout(compact, iterations, seed, start, pinned), fixed_cells
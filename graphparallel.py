@@ -0,0 +1,152 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import List, Tuple, Iterator, Sequence
+import os
+import numpy as np
+from graphcsr import CompactGraph
+
+
+# Graph and result matrix attached by every worker process in _attach
+_worker_graph = None
+_worker_result = None
+_worker_blocks = []
+
+
+"""
+Shared memory copy of NumPy arrays.
+The arrays are copied once by the parent, worker processes map the same pages without copying.
+"""
+class SharedArrays:
+	def __init__(self, arrays: Sequence[np.ndarray]):
+		self._blocks = []
+		self._specs = []
+
+		for array in arrays:
+			block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+			np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+			self._blocks.append(block)
+			self._specs.append((block.name, array.shape, array.dtype.str))
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	def get_specs(self) -> List[Tuple]:
+		return self._specs
+
+	def get_arrays(self) -> List[np.ndarray]:
+		return [np.ndarray(shape, dtype=dtype, buffer=block.buf) for block, (_, shape, dtype) in zip(self._blocks, self._specs)]
+
+	def close(self) -> None:
+		for block in self._blocks:
+			block.close()
+			block.unlink()
+		self._blocks = []
+
+
+def attach_arrays(specs: List[Tuple]) -> List[np.ndarray]:
+	arrays = []
+
+	for name, shape, dtype in specs:
+		# Workers share the resource tracker of the parent, which unlinks the block in SharedArrays.close
+		block = shared_memory.SharedMemory(name=name)
+		_worker_blocks.append(block)
+		arrays.append(np.ndarray(shape, dtype=dtype, buffer=block.buf))
+
+	return arrays
+
+
+def _attach(graph_specs: List[Tuple], result_specs: List[Tuple]) -> None:
+	global _worker_graph, _worker_result
+
+	_worker_graph = CompactGraph(*attach_arrays(graph_specs))
+	_worker_result = attach_arrays(result_specs)[0] if result_specs else None
+
+
+def _fill_rows(rows: List[Tuple[int, int]]) -> None:
+	for row, source in rows:
+		_worker_result[row] = _worker_graph.distances(source)
+
+
+def _rows(sources: List[int]) -> List[Tuple[int, np.ndarray]]:
+	return [(source, _worker_graph.distances(source)) for source in sources]
+
+
+def _pairs(tasks: List[Tuple[int, List[int], List[int]]]) -> List[Tuple[List[int], np.ndarray]]:
+	out = []
+	for source, positions, destinations in tasks:
+		out.append((positions, _worker_graph.distances(source)[destinations]))
+
+	return out
+
+
+def _chunks(items: list, processes: int) -> List[list]:
+	size = max(1, len(items) // (processes * 4))
+	return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _executor(shared: SharedArrays, result: SharedArrays, processes: int) -> ProcessPoolExecutor:
+	result_specs = result.get_specs() if result is not None else []
+	return ProcessPoolExecutor(processes, initializer=_attach, initargs=(shared.get_specs(), result_specs))
+
+
+def _graph_arrays(graph: CompactGraph) -> List[np.ndarray]:
+	return [graph.get_offsets(), graph.get_targets(), graph.get_weights()]
+
+
+# Distances from every source to every vertex, one row per source
+def distance_matrix(graph: CompactGraph, sources: List[int], processes: int = None) -> np.ndarray:
+	processes = processes or os.cpu_count()
+	if processes == 1:
+		return np.array([graph.distances(source) for source in sources]).reshape(len(sources), len(graph))
+
+	matrix = np.empty((len(sources), len(graph)), dtype=np.float64)
+	with SharedArrays(_graph_arrays(graph)) as shared, SharedArrays([matrix]) as result:
+		with _executor(shared, result, processes) as executor:
+			list(executor.map(_fill_rows, _chunks(list(enumerate(sources)), processes)))
+
+		matrix[...] = result.get_arrays()[0]
+
+	return matrix
+
+
+# Rows of the distance matrix as soon as they are computed, in the order of sources
+def iter_distances(graph: CompactGraph, sources: List[int], processes: int = None) -> Iterator[Tuple[int, np.ndarray]]:
+	processes = processes or os.cpu_count()
+	if processes == 1:
+		for source in sources:
+			yield source, graph.distances(source)
+		return
+
+	with SharedArrays(_graph_arrays(graph)) as shared:
+		with _executor(shared, None, processes) as executor:
+			for rows in executor.map(_rows, _chunks(list(sources), processes)):
+				yield from rows
+
+
+# Distance of every (source, destination) pair, every source is searched once
+def pair_distances(graph: CompactGraph, pairs: List[Tuple[int, int]], processes: int = None) -> np.ndarray:
+	by_source = {}
+	for position, (source, destination) in enumerate(pairs):
+		positions, destinations = by_source.setdefault(source, ([], []))
+		positions.append(position)
+		destinations.append(destination)
+
+	tasks = [(source, positions, destinations) for source, (positions, destinations) in by_source.items()]
+	out = np.empty(len(pairs), dtype=np.float64)
+
+	processes = processes or os.cpu_count()
+	if processes == 1:
+		for source, positions, destinations in tasks:
+			out[positions] = graph.distances(source)[destinations]
+		return out
+
+	with SharedArrays(_graph_arrays(graph)) as shared:
+		with _executor(shared, None, processes) as executor:
+			for results in executor.map(_pairs, _chunks(tasks, processes)):
+				for positions, distances in results:
+					out[positions] = distances
+
+	return out
@@ -1,37 +1,17 @@
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
 from vertexsystem.vertex import *
 from vertexsystem.overlay import *
 from graphutils import Graph, Vertex
+from graphlayout import layout_cells
+from vertexsystem.progress import ProgressView
 
 
-# Generate QPoints coordinates to place vertices
-def generate_points(count: int) -> Tuple[int, int]:
-	r = min(GraphWidget.width, GraphWidget.height) / 2 - 3
-	center = (GraphWidget.width / 2, GraphWidget.height / 2)
-	alpha = 360 / count
-
-	for i in range(count):
-		angle = alpha * i
-		x, y = r * sin(angle), r * cos(angle)
-
-		if alpha * i <= 90:
-			pass
-		elif alpha * i <= 180:
-			y = -1 * y
-		elif alpha * i <= 270:
-			x, y = -1 * x, -1 * y
-		elif alpha * i <= 360:
-			x = -1 * x
-
-		yield center[0] + x, center[1] + y
-
-
-class GraphWidget(QtWidgets.QDialog):
+class GraphWidget(ProgressView, QtWidgets.QDialog):
 	# Width and height are number of cells in grid - horizontally and vertically
 	width = 30
 	height = 30
 
-	def __init__(self, graph: Graph, parent=None):
+	def __init__(self, graph: Graph, parent=None, positions: Dict[Vertex, Tuple[int, int]] = None):
 		super(GraphWidget, self).__init__(parent)
 
 		self.setMinimumSize(200, 200)
@@ -40,6 +20,15 @@ class GraphWidget(QtWidgets.QDialog):
 		self._vert_widget_dict = {}
 		self._vert_point_dict = {}
 		self._vertex_color = QtGui.QColor(51, 153, 255)
+		self._settled_color = QtGui.QColor(120, 200, 120)
+		# Edges of the highlighted path, stored in both directions {(vert_a, vert_b)}
+		self._path_edges = set()
+		# Geometry cache: grid cell of every vertex {vertex: (row, column)}, the pixel size of a cell and
+		# the edge list handed to the overlay, rebuilt only after the graph, the cells or the size change
+		self._vert_cell_dict = {}
+		self._cell_size = None
+		self._edges = None
+		self._edges_version = None
 
 		layout = QtWidgets.QGridLayout(self)
 		layout.setHorizontalSpacing(0)
@@ -50,11 +39,12 @@ class GraphWidget(QtWidgets.QDialog):
 		for i in range(GraphWidget.width):
 			for j in range(GraphWidget.height):
 				empty_vertex = VertexWidget(self, None)
-				layout.addWidget(DragAndDropWidget(self, empty_vertex), i, j)
-				empty_vertex.update_position()
+				layout.addWidget(DragAndDropWidget(self, empty_vertex, (i, j)), i, j)
 
-		for vert, point in zip(graph, generate_points(len(graph))):
-			item_to_remove = layout.itemAtPosition(point[0], point[1])
+		# Rows of the grid go up to width and columns up to height. Vertices with a saved cell keep it.
+		cells = layout_cells(graph, GraphWidget.height, GraphWidget.width, positions=positions)
+		for vert, cell in cells.items():
+			item_to_remove = layout.itemAtPosition(cell[0], cell[1])
 			widget = item_to_remove.widget()
 			layout.removeItem(item_to_remove)
 			widget.deleteLater()
@@ -62,13 +52,18 @@ class GraphWidget(QtWidgets.QDialog):
 			vertex_widget = VertexWidget(self, self._vertex_color, vertex=vert)
 			vertex_widget.set_text(str(vert))
 			vertex_widget.setToolTip(str(vert))
-			drag_drop_vert = DragAndDropWidget(self, vertex_widget)
+			drag_drop_vert = DragAndDropWidget(self, vertex_widget, cell)
 
-			layout.addWidget(drag_drop_vert, point[0], point[1])
+			layout.addWidget(drag_drop_vert, cell[0], cell[1])
 			self._vert_widget_dict[vert] = vertex_widget
+			self._vert_cell_dict[vert] = cell
 
 		self.layout = layout
 
+		# Positions are read from the cells, which needs the complete layout
+		for i in range(layout.count()):
+			layout.itemAt(i).widget().get_vertex_widget().update_position()
+
 		h, w = DragAndDropWidget.dag_size * GraphWidget.width + 50, DragAndDropWidget.dag_size * GraphWidget.height + 50
 		qsize = QtCore.QSize(h, w)
 		self.setMinimumSize(qsize)
@@ -80,34 +75,53 @@ class GraphWidget(QtWidgets.QDialog):
 		self._overlay.raise_()
 		self._overlay.setAttribute(QtCore.Qt.WA_TransparentForMouseEvents)
 
+		# Edges edited through the graph, a Graph.batch included, are redrawn once the edit is reported
+		graph.on_change(self._edges_changed)
+
 	def paintEvent(self, event: QtGui.QPaintEvent):
+		if self._edges is None or self._edges_version != self._graph.get_version():
+			self._edges = self._build_edges()
+			self._edges_version = self._graph.get_version()
+			self._overlay.set_edges(self._edges)
+			# Otherwise the overlay is repainted with whatever is repainted under it. Updating it on every paint
+			# would schedule the next paint of the whole grid.
+			self._overlay.update()
+
+	def resizeEvent(self, event: QtGui.QResizeEvent):
+		super().resizeEvent(event)
+		self._cell_size = None
+		self.invalidate_geometry()
+
+	def _build_edges(self) -> list:
 		edges = []
+		centers = {vert: self.get_cell_center(cell) for vert, cell in self._vert_cell_dict.items()}
 
 		for vert in self._graph:
-			for conn in vert:
-				widget_a = self._vert_widget_dict[vert].parent()
-				widget_b = self._vert_widget_dict[conn[0]].parent()
+			for neighbor, weigh in vert:
+				edges.append([centers[vert], centers[neighbor], weigh, (vert, neighbor) in self._path_edges])
 
-				index_a = self.layout.indexOf(widget_a)
-				index_b = self.layout.indexOf(widget_b)
+		return edges
 
-				pos_a = self.layout.getItemPosition(index_a)
-				pos_b = self.layout.getItemPosition(index_b)
+	# Drop the cached edge list, it is rebuilt on the next paint
+	def invalidate_geometry(self) -> None:
+		self._edges = None
+		self.update()
 
-				w_coeff = self.layout.totalMinimumSize().width() / self.layout.columnCount()
-				h_coeff = self.layout.totalMinimumSize().height() / self.layout.rowCount()
+	# Pixel centre of a grid cell
+	def get_cell_center(self, cell: Tuple[int, int]) -> QPoint:
+		if self._cell_size is None:
+			self._cell_size = (self.layout.totalMinimumSize().width() / self.layout.columnCount(),
+							   self.layout.totalMinimumSize().height() / self.layout.rowCount())
 
-				a = QPoint(pos_a[1] * w_coeff, pos_a[0] * h_coeff)
-				b = QPoint(pos_b[1] * w_coeff, pos_b[0] * h_coeff)
+		w_coeff, h_coeff = self._cell_size
+		center = QPoint(cell[1] * w_coeff, cell[0] * h_coeff)
+		return center + QPoint(DragAndDropWidget.dag_size / 2, DragAndDropWidget.dag_size / 2)
 
-				a += QPoint(DragAndDropWidget.dag_size / 2, DragAndDropWidget.dag_size / 2)
-				b += QPoint(DragAndDropWidget.dag_size / 2, DragAndDropWidget.dag_size / 2)
-
-				weigh = conn[1]
-				edges.append([a, b, weigh])
-
-		self._overlay.set_edges(edges)
-		self._overlay.update()
+	# Called by DragAndDropWidget when a vertex is dropped on another cell
+	def vertex_moved(self, vertex: Vertex, cell: Tuple[int, int]) -> None:
+		if vertex is not None:
+			self._vert_cell_dict[vertex] = cell
+			self.invalidate_geometry()
 
 	def add_vertex(self, vertex: Vertex, x: int, y: int) -> None:
 		self._graph.append(vertex)
@@ -118,6 +132,9 @@ class GraphWidget(QtWidgets.QDialog):
 
 		self._vert_widget_dict.update({vertex: vertex_widget})
 		self._vert_point_dict.update({vertex_widget: QPoint(x, y)})
+		self._vert_cell_dict[vertex] = (x, y)
+		vertex_widget.update_position()
+		self.invalidate_geometry()
 
 	def add_connection(self, source: Vertex, destination: Vertex, weigh: int = 1) -> None:
 		self._graph.connect(source, destination, weigh)
@@ -125,33 +142,43 @@ class GraphWidget(QtWidgets.QDialog):
 	def remove_connection(self, source: Vertex, destination: Vertex) -> None:
 		self._graph.disconnect(source, destination)
 
+	def set_weight(self, source: Vertex, destination: Vertex, weigh: int) -> None:
+		self._graph.set_weight(source, destination, weigh)
+
+	def _edges_changed(self, changes: List[Tuple[Vertex, Vertex, Optional[float], Optional[float]]]) -> None:
+		self.invalidate_geometry()
+
 	def get_dict(self) -> Dict[Vertex, VertexWidget]:
 		return self._vert_widget_dict
 
-	def get_grid_cell(self, qpoint: QPoint) -> Tuple[int]:
+	# Grid cell of every vertex {vertex: (row, column)}, e.g. for graphutils.grid_heuristic
+	def get_grid_positions(self) -> Dict[Vertex, Tuple[int, int]]:
+		return dict(self._vert_cell_dict)
+
+	# Grid cell under a point of the widget, None over the margins between the cells
+	def get_grid_cell(self, qpoint: QPoint) -> Optional[Tuple[int]]:
 		drop_widget = self.childAt(qpoint)
-		index = self.layout.indexOf(drop_widget)
 
 		# In case we click VertexWidget instead of DragAndDropWidget
-		if index == -1:
-			vertex_widget = drop_widget
-			drop_widget = vertex_widget.get_drag_and_drop()
-			index = self.layout.indexOf(drop_widget)
+		if isinstance(drop_widget, VertexWidget):
+			drop_widget = drop_widget.get_drag_and_drop()
+
+		return drop_widget.get_cell() if isinstance(drop_widget, DragAndDropWidget) else None
 
-		position = self.layout.getItemPosition(index)
-		return position[0], position[1]
+	# Vertex shown at a point of the widget, None over an empty cell
+	def vertex_at(self, qpoint: QPoint) -> Vertex:
+		widget = self.childAt(qpoint)
 
-	def reset(self) -> None:
-		for key in self._vert_widget_dict:
-			self._vert_widget_dict[key].set_text(str(key))
+		if isinstance(widget, DragAndDropWidget):
+			widget = widget.get_vertex_widget()
+		return widget.get_vertex() if isinstance(widget, VertexWidget) else None
 
-	def dijkstra_init(self, source: Vertex, destination: Vertex) -> None:
-		self._graph.dijkstra_init(source, destination)
+	def animate_select(self, vertex: Vertex) -> None:
+		self._vert_widget_dict[vertex].select_animatinon()
 
-	def dijkstra_step(self, steps: int = 1) -> None:
-		self._graph.dijkstra_step(steps)
-		distance_dict = self._graph.get_distance_dict()
+	# Every VertexWidget repaints itself, so the rest of the grid is left alone
+	def _vertices_changed(self, dirty: Optional[Dict[Vertex, str]]) -> None:
+		pass
 
-		for key in distance_dict:
-			vertex_widget = self._vert_widget_dict[key]
-			vertex_widget.set_text(str(distance_dict[key]))
+	def _path_changed(self) -> None:
+		self.invalidate_geometry()
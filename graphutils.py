@@ -1,27 +1,71 @@
-from typing import List, Dict
+from typing import List, Dict, Tuple, Any, Optional, Iterator, Callable, KeysView, ItemsView, TYPE_CHECKING
+from collections import OrderedDict
+from contextlib import contextmanager
+import heapq
+import itertools
 import math
 import string
+import sys
+import time
+
+if TYPE_CHECKING:
+	import numpy as np
+	from graphcsr import CompactGraph
+
+
+# Display name of the n-th automatically named vertex: a, b, ..., z, aa, ab, ...
+def format_name(label: int) -> str:
+	name = ""
+	label += 1
+	while label > 0:
+		label, rest = divmod(label - 1, 26)
+		name = string.ascii_lowercase[rest] + name
+
+	return name
+
+
+"""
+Per-graph pool of automatic vertex names.
+Names are handed out in order, skipping the ones already taken by explicitly named vertices.
+"""
+class NameSpace:
+	def __init__(self):
+		self._next = 0
+		self._taken = set()
+
+	def reserve(self, name: str) -> None:
+		self._taken.add(name)
+
+	def allocate(self) -> int:
+		while self._taken and format_name(self._next) in self._taken:
+			self._next += 1
+
+		label = self._next
+		self._next += 1
+		return label
 
 
 class Vertex:
-	available_names = list(string.ascii_lowercase)
+	__slots__ = ("_id", "_name", "_verts_dict")
+	_ids = itertools.count()
 
 	def __init__(self, name=None):
 		# Dictionary of vertices this vertex is connected to {other_vertex, weigh}
 		self._verts_dict = {}
 
-		if name in Vertex.available_names:
-			Vertex.available_names.remove(name)
-		elif name is None:
-			name = Vertex.available_names.pop(0)
+		self._id = next(Vertex._ids)
+		# Either an explicit name or an integer label from the NameSpace of the graph the vertex is
+		# appended to. Labels are only formatted when the name is displayed.
 		self._name = name
 
-		self._keys_list = []
-
 	def __iter__(self):
 		return VertexIterator(self)
 
 	def __str__(self):
+		if self._name is None:
+			return "#" + str(self._id)
+		elif isinstance(self._name, int):
+			return format_name(self._name)
 		return self._name
 
 	def __len__(self):
@@ -30,155 +74,1093 @@ class Vertex:
 	def __getitem__(self, key):
 		return self._verts_dict[key]
 
+	def __contains__(self, vertex):
+		return vertex in self._verts_dict
+
 	def __lt__(self, other):
 		return str(self) < str(other)
 
-	def keys(self) -> List:
-		return self._keys_list
+	def get_id(self) -> int:
+		return self._id
+
+	def set_label(self, label: int) -> None:
+		self._name = label
+
+	def is_named(self) -> bool:
+		return self._name is not None
+
+	# Neighbors in the order they were connected. The dict doubles as the position index,
+	# so both connecting and disconnecting are O(1).
+	def keys(self) -> KeysView:
+		return self._verts_dict.keys()
+
+	def items(self) -> ItemsView:
+		return self._verts_dict.items()
 
 	def connect(self, vertex: "Vertex", weigh: float) -> None:
-		self._verts_dict.update({vertex: weigh})
-		self._keys_list.append(vertex)
+		self._verts_dict[vertex] = weigh
 
 	def disconnect(self, vertex: "Vertex") -> None:
 		self._verts_dict.pop(vertex)
-		self._keys_list.remove(vertex)
 
 
 class VertexIterator:
 	def __init__(self, vertex):
 		self._vertex = vertex
-		self._keys = vertex.keys()
-		self._index = 0
+		self._items = iter(vertex.items())
 
 	def __iter__(self):
 		return self
 
 	def __next__(self):
-		if self._index < len(self._keys):
-			key = self._keys[self._index]
-			self._index += 1
-			return key, self._vertex[key]
+		return next(self._items)
 
-		raise StopIteration
+
+# Walk the predecessors back from the destination, O(path length). Empty when the destination was not reached.
+def trace_path(predecessor_dict: Dict[Vertex, Vertex], source: Vertex, destination: Vertex) -> List[Vertex]:
+	if destination is not source and destination not in predecessor_dict:
+		return []
+
+	path = [destination]
+	while path[-1] is not source:
+		path.append(predecessor_dict[path[-1]])
+
+	path.reverse()
+	return path
+
+
+"""
+Binary heap keyed by priority with lazy deletion.
+Pushing an item that is already queued acts as decrease-key: the old heap entry stays in place
+and is skipped when popped. Ties are broken by insertion order, so items are never compared.
+"""
+class PriorityQueue:
+	def __init__(self):
+		self._heap = []
+		# Sequence number of the live heap entry of every queued item {item: seq}
+		self._entries = {}
+		self._seq = 0
+
+	def __len__(self):
+		return len(self._entries)
+
+	def __contains__(self, item):
+		return item in self._entries
+
+	def push(self, item: Any, priority: float) -> None:
+		seq = self._seq
+		self._seq += 1
+		self._entries[item] = seq
+		heapq.heappush(self._heap, (priority, seq, item))
+
+	def pop(self) -> Tuple[Any, float]:
+		while self._heap:
+			priority, seq, item = heapq.heappop(self._heap)
+
+			# Skip entries superseded by a later push of the same item
+			if self._entries.get(item) == seq:
+				del self._entries[item]
+				return item, priority
+
+		raise KeyError("pop from an empty priority queue")
+
+	# Lowest (item, priority) without removing it
+	def peek(self) -> Tuple[Any, float]:
+		while self._heap:
+			priority, seq, item = self._heap[0]
+			if self._entries.get(item) == seq:
+				return item, priority
+			heapq.heappop(self._heap)
+
+		raise KeyError("peek into an empty priority queue")
+
+	# Heap entries including stale ones, the difference around a pop is the number of entries it skipped
+	def get_heap_size(self) -> int:
+		return len(self._heap)
+
+	def copy(self) -> "PriorityQueue":
+		queue = PriorityQueue()
+		queue._heap = list(self._heap)
+		queue._entries = dict(self._entries)
+		queue._seq = self._seq
+		return queue
+
+
+"""
+Opt-in counters, phase timings and callbacks for the Dijkstra engine, see Graph.set_instrumentation.
+Without an instrumentation the engine runs its plain loop, so turning it off costs one attribute check per query.
+Phase timings split the search time into queue operations, reading the adjacency of settled vertices
+and relaxing their edges. They call the clock around every operation, so they can be disabled on their own.
+"""
+class Instrumentation:
+	COUNTERS = ("pushes", "pops", "stale_pops", "relaxations", "improvements", "settled")
+	PHASES = ("queue", "iteration", "relax")
+
+	def __init__(self, timings: bool = True):
+		self._timings_enabled = timings
+		self._counters = dict.fromkeys(Instrumentation.COUNTERS, 0)
+		self._timings = dict.fromkeys(Instrumentation.PHASES, 0.0)
+		# Callbacks settle(vertex, distance) and relax(vertex, neighbor, distance, improved)
+		self._settle_callbacks = []
+		self._relax_callbacks = []
+
+	def on_settle(self, callback: Callable[[Vertex, float], None]) -> None:
+		self._settle_callbacks.append(callback)
+
+	def on_relax(self, callback: Callable[[Vertex, Vertex, float, bool], None]) -> None:
+		self._relax_callbacks.append(callback)
+
+	def remove_callback(self, callback: Callable) -> None:
+		for callbacks in (self._settle_callbacks, self._relax_callbacks):
+			if callback in callbacks:
+				callbacks.remove(callback)
+
+	def is_timed(self) -> bool:
+		return self._timings_enabled
+
+	def count(self, counter: str, amount: int = 1) -> None:
+		self._counters[counter] += amount
+
+	def add_time(self, phase: str, seconds: float) -> None:
+		self._timings[phase] += seconds
+
+	def settle(self, vertex: Vertex, distance: float) -> None:
+		self._counters["settled"] += 1
+		for callback in self._settle_callbacks:
+			callback(vertex, distance)
+
+	def relax(self, vertex: Vertex, neighbor: Vertex, distance: float, improved: bool) -> None:
+		self._counters["relaxations"] += 1
+		if improved:
+			self._counters["improvements"] += 1
+		for callback in self._relax_callbacks:
+			callback(vertex, neighbor, distance, improved)
+
+	def get_counters(self) -> Dict[str, int]:
+		return dict(self._counters)
+
+	# Seconds spent in every phase, all zero when timings are disabled
+	def get_timings(self) -> Dict[str, float]:
+		return dict(self._timings)
+
+	def reset(self) -> None:
+		self._counters = dict.fromkeys(Instrumentation.COUNTERS, 0)
+		self._timings = dict.fromkeys(Instrumentation.PHASES, 0.0)
+
+
+def _no_clock() -> float:
+	return 0.0
+
+
+"""
+Step by step Dijkstra run used by the visualizer. Every step examines a single edge of the current vertex.
+The state is saved every checkpoint_interval steps, so seek() restores the closest earlier checkpoint and
+replays at most checkpoint_interval steps instead of starting over from the source.
+"""
+class DijkstraStepper:
+	def __init__(self, graph: "Graph", source: Vertex, destination: Vertex, checkpoint_interval: int = None,
+				 instrumentation: Instrumentation = None):
+		# Restoring a checkpoint copies O(V) state anyway, so denser checkpoints would only cost memory
+		if checkpoint_interval is None:
+			checkpoint_interval = max(256, len(graph))
+
+		# Graph or GraphSnapshot, only read through neighbors()
+		self._graph = graph
+		self._source = source
+		self._destination = destination
+		self._checkpoint_interval = checkpoint_interval
+		# Counters and callbacks of the steps. Every step is reported once, steps replayed after seeking back are not.
+		self._instrumentation = instrumentation
+		self._furthest = 0
+
+		self._distance_dict = {vert: math.inf for vert in graph}
+		self._distance_dict[source] = 0
+		self._predecessor_dict = {}
+		self._queue = PriorityQueue()
+		self._queue.push(source, 0)
+		if instrumentation is not None:
+			instrumentation.count("pushes")
+
+		self._vert = source
+		self._edges = []
+		self._edge_index = 0
+		self._done_with_for_loop = True
+		self._step = 0
+		# Vertices whose distance changed {vertex: distance} and vertices settled since the last take_changes()
+		self._changed = {}
+		self._settled = []
+
+		# Checkpoint k holds the state after k * checkpoint_interval steps
+		self._checkpoints = [self._checkpoint()]
+
+	def __iter__(self):
+		return self.iter_steps()
+
+	def _checkpoint(self) -> Tuple:
+		return (self._distance_dict.copy(), self._predecessor_dict.copy(), self._queue.copy(), self._vert,
+				self._edge_index, self._done_with_for_loop, self._step)
+
+	def _restore(self, checkpoint: Tuple) -> None:
+		distance_dict, predecessor_dict, queue, vert, edge_index, done_with_for_loop, step = checkpoint
+		self._distance_dict = distance_dict.copy()
+		self._predecessor_dict = predecessor_dict.copy()
+		self._queue = queue.copy()
+		self._vert = vert
+		self._edges = self._graph.neighbors(vert)
+		self._edge_index = edge_index
+		self._done_with_for_loop = done_with_for_loop
+		self._step = step
+
+		# Any vertex may differ from what was reported, so everything is reported again
+		self._changed = self._distance_dict.copy()
+		self._settled = [vert for vert, distance in self._distance_dict.items()
+						 if distance < math.inf and vert not in self._queue]
+
+	# Perform a single step, returns False when the algorithm has already finished
+	def _advance(self) -> bool:
+		instrumentation = self._instrumentation if self._step == self._furthest else None
+
+		# Step by step while loop from Graph.dijkstra
+		if self._done_with_for_loop is True:
+			if len(self._queue) == 0:
+				return False
+
+			size = self._queue.get_heap_size()
+			self._vert, distance = self._queue.pop()
+			self._edges = self._graph.neighbors(self._vert)
+			self._edge_index = 0
+			self._done_with_for_loop = False
+			self._settled.append(self._vert)
+
+			if instrumentation is not None:
+				instrumentation.count("pops")
+				instrumentation.count("stale_pops", size - self._queue.get_heap_size() - 1)
+				instrumentation.settle(self._vert, distance)
+
+		# Step by step for loop
+		if self._edge_index < len(self._edges):
+			neighbor, weigh = self._edges[self._edge_index]
+			self._edge_index += 1
+			distance = self._distance_dict[self._vert] + weigh
+
+			improved = distance < self._distance_dict[neighbor]
+			if improved:
+				self._distance_dict[neighbor] = distance
+				self._predecessor_dict[neighbor] = self._vert
+				self._queue.push(neighbor, distance)
+				self._changed[neighbor] = distance
+
+			if instrumentation is not None:
+				if improved:
+					instrumentation.count("pushes")
+				instrumentation.relax(self._vert, neighbor, distance, improved)
+		else:
+			self._done_with_for_loop = True
+
+		self._step += 1
+		self._furthest = max(self._furthest, self._step)
+		if self._step == len(self._checkpoints) * self._checkpoint_interval:
+			self._checkpoints.append(self._checkpoint())
+
+		return True
+
+	def iter_steps(self):
+		while self._advance():
+			yield self._step
+
+	def step(self, steps: int = 1) -> int:
+		done = 0
+		while done < steps and self._advance():
+			done += 1
+
+		return done
+
+	def seek(self, step: int) -> None:
+		step = max(step, 0)
+
+		# Going forward a checkpoint is only restored if it is ahead of the current step
+		index = min(step // self._checkpoint_interval, len(self._checkpoints) - 1)
+		if step < self._step or index * self._checkpoint_interval > self._step:
+			self._restore(self._checkpoints[index])
+
+		self.step(step - self._step)
+
+	def is_done(self) -> bool:
+		return self._done_with_for_loop is True and len(self._queue) == 0
+
+	# Changes since the previous call: new distances {vertex: distance} and newly settled vertices, so a view
+	# only updates those. After seeking back every vertex is reported.
+	def take_changes(self) -> Tuple[Dict[Vertex, float], List[Vertex]]:
+		changes = self._changed, self._settled
+		self._changed = {}
+		self._settled = []
+		return changes
+
+	def get_step(self) -> int:
+		return self._step
+
+	def get_distance_dict(self) -> Dict[Vertex, float]:
+		return self._distance_dict
+
+	def get_predecessor_dict(self) -> Dict[Vertex, Vertex]:
+		return self._predecessor_dict
+
+	def get_curr_vert(self) -> Vertex:
+		return self._vert
+
+	def get_instrumentation(self) -> Optional[Instrumentation]:
+		return self._instrumentation
+
+	# Best path to the destination found so far, final once the destination is settled
+	def get_path(self) -> List[Vertex]:
+		return trace_path(self._predecessor_dict, self._source, self._destination)
+
+
+"""
+Frozen copy of the vertices and edges of one version of a Graph.
+Later edits of the graph do not show up in it, so it can be searched from another thread while the graph is edited.
+The vertices are the ones of the graph, only their edges are copied.
+"""
+class GraphSnapshot:
+	def __init__(self, graph: "Graph"):
+		self._version = graph.get_version()
+		# Edges of every vertex {vertex: ((neighbor, weigh), ...)}
+		self._adjacency = {vert: tuple(vert.items()) for vert in graph}
+
+	def __iter__(self):
+		return iter(self._adjacency)
+
+	def __len__(self):
+		return len(self._adjacency)
+
+	def __contains__(self, vertex):
+		return vertex in self._adjacency
+
+	def get_version(self) -> int:
+		return self._version
+
+	def neighbors(self, vertex: Vertex) -> Tuple[Tuple[Vertex, float], ...]:
+		return self._adjacency[vertex]
+
+
+"""
+Distances from a single source, computed for one version of a graph.
+Vertices missing from the distance dictionary are unreachable.
+"""
+class ShortestPathTree:
+	def __init__(self, source: Vertex, version: int, distance_dict: Dict[Vertex, float],
+				 predecessor_dict: Dict[Vertex, Vertex]):
+		self._source = source
+		self._version = version
+		self._distance_dict = distance_dict
+		# Previous vertex on the shortest path to every reached vertex except the source
+		self._predecessor_dict = predecessor_dict
+
+	def get_source(self) -> Vertex:
+		return self._source
+
+	def get_version(self) -> int:
+		return self._version
+
+	def get_distance(self, vertex: Vertex) -> float:
+		return self._distance_dict.get(vertex, math.inf)
+
+	def get_distance_dict(self) -> Dict[Vertex, float]:
+		return self._distance_dict
+
+	def get_predecessor_dict(self) -> Dict[Vertex, Vertex]:
+		return self._predecessor_dict
+
+	def get_path(self, destination: Vertex) -> List[Vertex]:
+		return trace_path(self._predecessor_dict, self._source, destination)
+
+	# Rough size of the tree, used for the memory cap of ShortestPathCache
+	def nbytes(self) -> int:
+		return (sys.getsizeof(self._distance_dict) + 24 * len(self._distance_dict)
+				+ sys.getsizeof(self._predecessor_dict))
+
+
+"""
+Least recently used cache of ShortestPathTrees keyed by source.
+Trees computed for an older graph version are dropped as soon as they are seen.
+"""
+class ShortestPathCache:
+	def __init__(self, capacity: int = 16, max_bytes: int = 64 * 2 ** 20):
+		self._capacity = capacity
+		self._max_bytes = max_bytes
+		self._trees = OrderedDict()
+		self._bytes = 0
+
+		self._hits = 0
+		self._misses = 0
+		self._evictions = 0
+		self._invalidations = 0
+
+	def __len__(self):
+		return len(self._trees)
+
+	def _discard(self, source: Vertex) -> None:
+		self._bytes -= self._trees.pop(source).nbytes()
+
+	def get(self, source: Vertex, version: int) -> Optional[ShortestPathTree]:
+		tree = self._trees.get(source)
+
+		if tree is not None and tree.get_version() != version:
+			self._discard(source)
+			self._invalidations += 1
+			tree = None
+
+		if tree is None:
+			self._misses += 1
+			return None
+
+		self._trees.move_to_end(source)
+		self._hits += 1
+		return tree
+
+	def put(self, tree: ShortestPathTree) -> None:
+		size = tree.nbytes()
+		# A zero capacity or byte budget turns the cache off
+		if self._capacity <= 0 or self._max_bytes <= 0 or size > self._max_bytes:
+			return
+
+		if tree.get_source() in self._trees:
+			self._discard(tree.get_source())
+
+		# Stale trees go first, then the least recently used ones
+		for source in [key for key, value in self._trees.items() if value.get_version() != tree.get_version()]:
+			self._discard(source)
+			self._invalidations += 1
+
+		while self._trees and (len(self._trees) >= self._capacity or self._bytes + size > self._max_bytes):
+			self._discard(next(iter(self._trees)))
+			self._evictions += 1
+
+		self._trees[tree.get_source()] = tree
+		self._bytes += size
+
+	def clear(self) -> None:
+		self._trees.clear()
+		self._bytes = 0
+
+	def stats(self) -> Dict[str, int]:
+		return {
+			"hits": self._hits,
+			"misses": self._misses,
+			"evictions": self._evictions,
+			"invalidations": self._invalidations,
+			"entries": len(self._trees),
+			"bytes": self._bytes,
+		}
+
+
+"""
+Shortest path tree of one source kept up to date while edges of the graph are added, removed or change their weigh.
+Only the part of the tree a change affects is repaired (Ramalingam and Reps):
+- An edge that got shorter or was added is relaxed and the improvement spreads like in Dijkstra from there.
+- When a tree edge got longer or was removed, the vertices that lose their distance are found first, in order of
+  their old distance. A vertex keeps its distance if it still has a neighbor that is not affected and leads to it at
+  the same distance, otherwise it is affected and its children in the tree become candidates. The affected vertices then get
+  the best distance through an unaffected neighbor and a Dijkstra limited to them finishes the repair.
+So a change costs time for the vertices whose distance changes and their edges, not for the whole graph.
+Zero weighs make ties that are resolved by treating the vertex as affected, which is safe but does more work.
+The changes of a Graph.batch arrive together and are repaired in one pass.
+Vertices missing from the distance dictionary are unreachable. Weighs must not be negative.
+"""
+class DynamicShortestPathTree:
+	def __init__(self, graph: "Graph", source: Vertex):
+		self._graph = graph
+		self._source = source
+		self._distance_dict, self._predecessor_dict = graph._search(source)
+		# Distances that changed since the last take_changes(), math.inf for vertices that became unreachable
+		self._changed = {}
+		self._stats = {"repairs": 0, "affected": 0, "settled": 0}
+		graph.on_change(self._edges_changed)
+
+	def get_source(self) -> Vertex:
+		return self._source
+
+	def get_distance(self, vertex: Vertex) -> float:
+		return self._distance_dict.get(vertex, math.inf)
+
+	def get_distance_dict(self) -> Dict[Vertex, float]:
+		return self._distance_dict
+
+	def get_predecessor_dict(self) -> Dict[Vertex, Vertex]:
+		return self._predecessor_dict
+
+	def get_path(self, destination: Vertex) -> List[Vertex]:
+		return trace_path(self._predecessor_dict, self._source, destination)
+
+	# Distances changed by repairs since the previous call {vertex: distance}
+	def take_changes(self) -> Dict[Vertex, float]:
+		changes, self._changed = self._changed, {}
+		return changes
+
+	# Repairs done, vertices that lost their distance and vertices settled while repairing, summed over all repairs
+	def get_stats(self) -> Dict[str, int]:
+		return dict(self._stats)
+
+	# Stop following the graph
+	def close(self) -> None:
+		self._graph.remove_callback(self._edges_changed)
+
+	def _edges_changed(self, changes: List[Tuple[Vertex, Vertex, Optional[float], Optional[float]]]) -> None:
+		distance_dict, predecessor_dict = self._distance_dict, self._predecessor_dict
+		# Tails of edges that may now shorten a distance, and heads of tree edges that got longer or were removed
+		tails = []
+		roots = []
+
+		for vert_1, vert_2, old, new in changes:
+			for tail, head in ((vert_1, vert_2), (vert_2, vert_1)):
+				if new is not None and distance_dict.get(tail, math.inf) + new < distance_dict.get(head, math.inf):
+					tails.append(tail)
+				elif predecessor_dict.get(head) is tail and (new is None or new > old):
+					roots.append(head)
+
+		self._stats["repairs"] += 1
+		queue = self._repair_increases(roots) if roots else PriorityQueue()
+		for tail in tails:
+			if tail in distance_dict:
+				queue.push(tail, distance_dict[tail])
+		self._propagate(queue)
+
+	# Reset the vertices whose distance grows and queue them with their best distance through unaffected neighbors
+	def _repair_increases(self, roots: List[Vertex]) -> PriorityQueue:
+		distance_dict, predecessor_dict = self._distance_dict, self._predecessor_dict
+		affected = set()
+		candidates = PriorityQueue()
+		for root in roots:
+			candidates.push(root, distance_dict[root])
+
+		# Old distances are final for every vertex closer than the one popped, so "not affected" can be trusted there
+		while len(candidates) > 0:
+			vert, distance = candidates.pop()
+			if vert is self._source:
+				continue
+
+			kept = None
+			for neighbor, weigh in vert.items():
+				before = distance_dict.get(neighbor, math.inf)
+				if before < distance and before + weigh == distance and neighbor not in affected:
+					kept = neighbor
+					break
+
+			if kept is not None:
+				predecessor_dict[vert] = kept
+				continue
+
+			# Children are found by their predecessor and not by tight edges, whose weigh may be part of the same batch
+			affected.add(vert)
+			for neighbor in vert.keys():
+				if neighbor not in affected and predecessor_dict.get(neighbor) is vert:
+					candidates.push(neighbor, distance_dict[neighbor])
+
+		for vert in affected:
+			del distance_dict[vert]
+			predecessor_dict.pop(vert, None)
+		self._stats["affected"] += len(affected)
+
+		queue = PriorityQueue()
+		for vert in affected:
+			best, through = math.inf, None
+			for neighbor, weigh in vert.items():
+				if neighbor not in affected and distance_dict.get(neighbor, math.inf) + weigh < best:
+					best, through = distance_dict[neighbor] + weigh, neighbor
+
+			# Later improvements overwrite the change reported here
+			self._changed[vert] = best
+			if through is not None:
+				distance_dict[vert] = best
+				predecessor_dict[vert] = through
+				queue.push(vert, best)
+
+		return queue
+
+	# Dijkstra from the queued vertices, improving every distance it reaches until nothing improves any more
+	def _propagate(self, queue: PriorityQueue) -> None:
+		distance_dict, predecessor_dict = self._distance_dict, self._predecessor_dict
+
+		while len(queue) > 0:
+			vert, distance = queue.pop()
+			self._stats["settled"] += 1
+
+			for neighbor, weigh in vert.items():
+				if distance + weigh < distance_dict.get(neighbor, math.inf):
+					distance_dict[neighbor] = distance + weigh
+					predecessor_dict[neighbor] = vert
+					self._changed[neighbor] = distance + weigh
+					queue.push(neighbor, distance + weigh)
+
+
+"""
+Outcome of a point to point search: the distance and the number of vertices settled to find it.
+"""
+class SearchResult:
+	def __init__(self, distance: float, settled: int, path: List[Vertex]):
+		self._distance = distance
+		self._settled = settled
+		self._path = path
+
+	def get_distance(self) -> float:
+		return self._distance
+
+	def get_settled(self) -> int:
+		return self._settled
+
+	# Vertices from the source to the destination, empty when the destination is unreachable
+	def get_path(self) -> List[Vertex]:
+		return self._path
+
+
+# A* heuristic from grid positions {vertex: (row, column)}, such as GraphWidget.get_grid_positions().
+# The straight line distance between cells is scaled by the lowest weigh per cell of any edge, so the heuristic
+# never overestimates and stays consistent. Without a position for every vertex it falls back to zero.
+def grid_heuristic(graph: "Graph", positions: Dict[Vertex, Tuple[int, int]]) -> Callable[[Vertex, Vertex], float]:
+	scale = math.inf
+
+	for vert in graph:
+		if vert not in positions:
+			scale = 0
+			break
+
+		for neighbor, weigh in vert:
+			if neighbor not in positions:
+				continue
+
+			cells = math.dist(positions[vert], positions[neighbor])
+			if cells > 0:
+				scale = min(scale, weigh / cells)
+
+	if scale == math.inf:
+		scale = 0
+
+	return lambda vert, destination: scale * math.dist(positions[vert], positions[destination]) if scale else 0
+
+
+# Merge the changes of every edge into one, from its weigh before the first change to the one after the last.
+# Edges that end up as they started are dropped.
+def _coalesce(changes: List[Tuple[Vertex, Vertex, Optional[float], Optional[float]]]) \
+		-> List[Tuple[Vertex, Vertex, Optional[float], Optional[float]]]:
+	merged = {}
+	for vert_1, vert_2, old, new in changes:
+		if (vert_2, vert_1) in merged:
+			vert_1, vert_2 = vert_2, vert_1
+		first = merged.get((vert_1, vert_2))
+		merged[(vert_1, vert_2)] = (old if first is None else first[0], new)
+
+	return [(vert_1, vert_2, old, new) for (vert_1, vert_2), (old, new) in merged.items() if old != new]
 
 
 class Graph:
 	def __init__(self, *args, **kwargs):
+		# Vertices in insertion order, removed vertices leave a None hole until the list is packed
 		self._vertices = []
-		# Fields to be initialized in dijkstra_init
-		self._distance_dict = None
-		self._queue = None
-		self._source = None
-		self._destination = None
-		self._iter = None
-		self._vert = None
-		self._vert_iter = None
-		self._done_with_for_loop = None
+		# Index of every vertex in self._vertices {vertex: slot}
+		self._slots = {}
+		self._holes = 0
+		# Bumped on every change of the graph, cached results of older versions are stale
+		self._version = 0
+		self._cache = ShortestPathCache()
+		# Step by step algorithm, initialized in dijkstra_init
+		self._stepper = None
+		self._names = NameSpace()
+		# Counters and callbacks of the Dijkstra engine, None runs the plain loops
+		self._instrumentation = None
+		# Called with the list of edges that changed, see on_change
+		self._listeners = []
+		# Changes collected by the open batches and how deeply they are nested, see batch
+		self._pending = []
+		self._batch_depth = 0
 
 		for arg in args:
-			self._vertices.append(arg)
+			self.append(arg)
 
 	def __getitem__(self, key):
+		if self._holes > 0:
+			self._pack()
 		return self._vertices[key]
 
 	def __iter__(self):
 		return GraphIterator(self)
 
 	def __len__(self):
-		return len(self._vertices)
+		return len(self._slots)
+
+	def __contains__(self, vertex):
+		return vertex in self._slots
+
+	# Drop the holes left by removed vertices
+	def _pack(self) -> None:
+		self._vertices = [vert for vert in self._vertices if vert is not None]
+		self._slots = {vert: slot for slot, vert in enumerate(self._vertices)}
+		self._holes = 0
 
 	def append(self, vertex: Vertex) -> None:
-		self._vertices.append(vertex)
+		if not vertex.is_named():
+			vertex.set_label(self._names.allocate())
+		else:
+			self._names.reserve(str(vertex))
 
+		if vertex not in self._slots:
+			self._slots[vertex] = len(self._vertices)
+			self._vertices.append(vertex)
+			self._version += 1
+
+	def remove(self, vertex: Vertex) -> None:
+		if vertex not in self._slots:
+			return
+
+		for neighbor in list(vertex.keys()):
+			self.disconnect(vertex, neighbor)
+
+		self._vertices[self._slots.pop(vertex)] = None
+		self._holes += 1
+		if self._holes > len(self._vertices) // 2:
+			self._pack()
+		self._version += 1
+
+	# Connecting vertices that are already connected changes the weigh of their edge
 	def connect(self, vert_1: Vertex, vert_2: Vertex, weigh: float) -> None:
-		if vert_1 in self._vertices and vert_2 in self._vertices:
+		if vert_1 in self._slots and vert_2 in self._slots:
+			old = vert_1[vert_2] if self._listeners and vert_2 in vert_1 else None
 			vert_1.connect(vert_2, weigh)
 			vert_2.connect(vert_1, weigh)
+			self._version += 1
+			if self._listeners:
+				self._notify([(vert_1, vert_2, old, weigh)])
 
 	def disconnect(self, vert_1: Vertex, vert_2: Vertex) -> None:
-		if vert_1 in self._vertices and vert_2 in self._vertices:
+		if vert_1 in self._slots and vert_2 in self._slots:
+			old = vert_1[vert_2] if self._listeners else None
 			vert_1.disconnect(vert_2)
-			vert_2.disconnect(vert_1)
+			if vert_1 is not vert_2:
+				vert_2.disconnect(vert_1)
+			self._version += 1
+			if self._listeners:
+				self._notify([(vert_1, vert_2, old, None)])
+
+	# Change the weigh of an existing edge in both directions, without removing and inserting it again
+	def set_weight(self, vert_1: Vertex, vert_2: Vertex, weigh: float) -> None:
+		if vert_1 not in self._slots or vert_2 not in vert_1:
+			raise KeyError((vert_1, vert_2))
 
-	def dijkstra(self, source: Vertex, destination: Vertex) -> Dict[Vertex, float]:
-		distance_dict = {vert: math.inf for vert in self._vertices}
-		distance_dict[source] = 0
-		queue = {k: v for k, v in sorted(distance_dict.items(), key=lambda item: item[1])}
+		old = vert_1[vert_2]
+		if old == weigh:
+			return
+		vert_1.connect(vert_2, weigh)
+		vert_2.connect(vert_1, weigh)
+		self._version += 1
+		if self._listeners:
+			self._notify([(vert_1, vert_2, old, weigh)])
+
+	# Apply many edits as one: listeners are called once when the outermost batch ends, with one change per edge
+	# that differs from before the batch. Changes made before an exception are still reported.
+	@contextmanager
+	def batch(self) -> Iterator["Graph"]:
+		self._batch_depth += 1
+		try:
+			yield self
+		finally:
+			self._batch_depth -= 1
+			if self._batch_depth == 0 and self._pending:
+				changes, self._pending = _coalesce(self._pending), []
+				if changes:
+					self._notify(changes)
+
+	def in_batch(self) -> bool:
+		return self._batch_depth > 0
+
+	# Register a callback for edge changes. It gets a list of (vert_1, vert_2, old weigh, new weigh) tuples,
+	# the old weigh is None for a new edge and the new one None for a removed edge.
+	def on_change(self, callback: Callable[[List[Tuple[Vertex, Vertex, Optional[float], Optional[float]]]], None]) -> None:
+		self._listeners.append(callback)
+
+	def remove_callback(self, callback: Callable) -> None:
+		if callback in self._listeners:
+			self._listeners.remove(callback)
+
+	def _notify(self, changes: List[Tuple[Vertex, Vertex, Optional[float], Optional[float]]]) -> None:
+		if self._batch_depth > 0:
+			self._pending.extend(changes)
+			return
+		for callback in list(self._listeners):
+			callback(changes)
+
+	def has_edge(self, vert_1: Vertex, vert_2: Vertex) -> bool:
+		return vert_1 in self._slots and vert_2 in vert_1
+
+	# Edges (neighbor, weigh) of a vertex
+	def neighbors(self, vertex: Vertex) -> List[Tuple[Vertex, float]]:
+		return list(vertex)
+
+	def snapshot(self) -> GraphSnapshot:
+		return GraphSnapshot(self)
+
+	def get_version(self) -> int:
+		return self._version
+
+	def get_cache(self) -> Optional[ShortestPathCache]:
+		return self._cache
+
+	# Pass None to disable caching
+	def set_cache(self, cache: Optional[ShortestPathCache]) -> None:
+		self._cache = cache
+
+	def get_instrumentation(self) -> Optional[Instrumentation]:
+		return self._instrumentation
+
+	# Pass None to turn instrumentation off. Cached trees are served without searching, so nothing is reported for them.
+	def set_instrumentation(self, instrumentation: Optional[Instrumentation]) -> None:
+		self._instrumentation = instrumentation
+
+	def dijkstra(self, source: Vertex, destination: Vertex) -> float:
+		return self.shortest_path_tree(source).get_distance(destination)
+
+	def shortest_path_tree(self, source: Vertex) -> ShortestPathTree:
+		tree = self._cache.get(source, self._version) if self._cache is not None else None
+
+		if tree is None:
+			tree = ShortestPathTree(source, self._version, *self._search(source))
+			if self._cache is not None:
+				self._cache.put(tree)
+
+		return tree
+
+	def _search(self, source: Vertex) -> Tuple[Dict[Vertex, float], Dict[Vertex, Vertex]]:
+		if self._instrumentation is not None:
+			return self._search_instrumented(source, self._instrumentation)
+
+		distance_dict = {source: 0}
+		predecessor_dict = {}
+		queue = PriorityQueue()
+		queue.push(source, 0)
 
 		while len(queue) > 0:
-			vert = next(iter(queue))
-			queue.pop(vert)
+			vert, distance = queue.pop()
 
-			for conn in vert:
-				neighbor, weigh = conn[0], conn[1]
+			for neighbor, weigh in vert:
+				if distance + weigh < distance_dict.get(neighbor, math.inf):
+					distance_dict[neighbor] = distance + weigh
+					predecessor_dict[neighbor] = vert
+					queue.push(neighbor, distance + weigh)
 
-				if distance_dict[vert] + weigh < distance_dict[neighbor]:
-					distance_dict[neighbor] = distance_dict[vert] + weigh
-					queue[neighbor] = distance_dict[vert] + weigh
+		return distance_dict, predecessor_dict
 
-					queue = {k: v for k, v in sorted(queue.items(), key=lambda item: item[1])}
+	# Same search as _search, reporting every queue operation, settle and relaxation
+	def _search_instrumented(self, source: Vertex,
+							 instrumentation: Instrumentation) -> Tuple[Dict[Vertex, float], Dict[Vertex, Vertex]]:
+		clock = time.perf_counter if instrumentation.is_timed() else _no_clock
+		distance_dict = {source: 0}
+		predecessor_dict = {}
+		queue = PriorityQueue()
+		queue.push(source, 0)
+		instrumentation.count("pushes")
 
-		return distance_dict[destination]
+		while len(queue) > 0:
+			start = clock()
+			size = queue.get_heap_size()
+			vert, distance = queue.pop()
+			instrumentation.count("pops")
+			instrumentation.count("stale_pops", size - queue.get_heap_size() - 1)
+			instrumentation.settle(vert, distance)
 
-	def dijkstra_init(self, source: Vertex, destination: Vertex) -> None:
-		self._distance_dict = {vert: math.inf for vert in self._vertices}
-		self._distance_dict[source] = 0
-		self._queue = {k: v for k, v in sorted(self._distance_dict.items(), key=lambda item: item[1])}
-		self._source = source
-		self._destination = destination
-		self._vert = next(iter(self._queue))
-		self._done_with_for_loop = True
+			popped = clock()
+			edges = list(vert)
+			read = clock()
+			pushing = 0.0
+
+			for neighbor, weigh in edges:
+				improved = distance + weigh < distance_dict.get(neighbor, math.inf)
+				if improved:
+					distance_dict[neighbor] = distance + weigh
+					predecessor_dict[neighbor] = vert
+
+					push_start = clock()
+					queue.push(neighbor, distance + weigh)
+					pushing += clock() - push_start
+					instrumentation.count("pushes")
+
+				instrumentation.relax(vert, neighbor, distance + weigh, improved)
+
+			# Callbacks run inside the phase of the event they handle
+			instrumentation.add_time("queue", popped - start + pushing)
+			instrumentation.add_time("iteration", read - popped)
+			instrumentation.add_time("relax", clock() - read - pushing)
+
+		return distance_dict, predecessor_dict
+
+	# Vertices on a shortest path, taken from a cached tree of the source when there is one
+	def shortest_path(self, source: Vertex, destination: Vertex) -> List[Vertex]:
+		tree = self._cache.get(source, self._version) if self._cache is not None else None
+		if tree is not None:
+			return tree.get_path(destination)
+
+		return self.point_to_point(source, destination).get_path()
+
+	# Edges (vert_1, vert_2, weigh) along a path, O(path length)
+	def path_edges(self, path: List[Vertex]) -> List[Tuple[Vertex, Vertex, float]]:
+		return [(vert_1, vert_2, vert_1[vert_2]) for vert_1, vert_2 in zip(path, path[1:])]
+
+	# Point to point query, method is one of:
+	# "early" - Dijkstra stopping as soon as the destination is settled,
+	# "bidirectional" - Dijkstra from both ends, stopping when the two searches meet,
+	# "astar" - A* guided by heuristic(vertex, destination), see grid_heuristic.
+	def point_to_point(self, source: Vertex, destination: Vertex, method: str = "early",
+					   heuristic: Callable[[Vertex, Vertex], float] = None) -> SearchResult:
+		if method == "early":
+			return self._astar(source, destination, lambda vert, destination: 0)
+		elif method == "astar":
+			return self._astar(source, destination, heuristic or (lambda vert, destination: 0))
+		elif method == "bidirectional":
+			return self._bidirectional(source, destination)
+
+		raise ValueError("unknown point to point method: " + str(method))
+
+	def _astar(self, source: Vertex, destination: Vertex, heuristic: Callable[[Vertex, Vertex], float]) -> SearchResult:
+		distance_dict = {source: 0}
+		predecessor_dict = {}
+		settled = set()
+		queue = PriorityQueue()
+		queue.push(source, heuristic(source, destination))
+
+		while len(queue) > 0:
+			vert, _ = queue.pop()
+			settled.add(vert)
+			if vert is destination:
+				break
+
+			distance = distance_dict[vert]
+			for neighbor, weigh in vert:
+				if neighbor not in settled and distance + weigh < distance_dict.get(neighbor, math.inf):
+					distance_dict[neighbor] = distance + weigh
+					predecessor_dict[neighbor] = vert
+					queue.push(neighbor, distance + weigh + heuristic(neighbor, destination))
+
+		path = trace_path(predecessor_dict, source, destination)
+		return SearchResult(distance_dict.get(destination, math.inf), len(settled), path)
+
+	# Edges are stored on both endpoints, so the backward search walks the same adjacency
+	def _bidirectional(self, source: Vertex, destination: Vertex) -> SearchResult:
+		distance_dicts = ({source: 0}, {destination: 0})
+		predecessor_dicts = ({}, {})
+		settled = (set(), set())
+		queues = (PriorityQueue(), PriorityQueue())
+		queues[0].push(source, 0)
+		queues[1].push(destination, 0)
+		best = 0 if source is destination else math.inf
+		# Vertex where the best path found so far joins the two searches
+		meeting = source if source is destination else None
+
+		while len(queues[0]) > 0 and len(queues[1]) > 0:
+			# Expand the side with the smaller frontier
+			side = 0 if len(queues[0]) <= len(queues[1]) else 1
+			vert, distance = queues[side].pop()
+			settled[side].add(vert)
+
+			# Every later path is at least as long as the sum of both settled radii
+			if distance + queues[1 - side].peek()[1] >= best:
+				break
+
+			for neighbor, weigh in vert:
+				if neighbor in settled[side] or distance + weigh >= distance_dicts[side].get(neighbor, math.inf):
+					continue
+
+				distance_dicts[side][neighbor] = distance + weigh
+				predecessor_dicts[side][neighbor] = vert
+				queues[side].push(neighbor, distance + weigh)
+
+				if distance + weigh + distance_dicts[1 - side].get(neighbor, math.inf) < best:
+					best = distance + weigh + distance_dicts[1 - side][neighbor]
+					meeting = neighbor
+
+		path = []
+		if meeting is not None:
+			path = trace_path(predecessor_dicts[0], source, meeting)
+			path += reversed(trace_path(predecessor_dicts[1], destination, meeting)[:-1])
+
+		return SearchResult(best, len(settled[0]) + len(settled[1]), path)
+
+	# The steps are reported to the given instrumentation, by default to the one of the graph
+	def dijkstra_init(self, source: Vertex, destination: Vertex, instrumentation: Instrumentation = None) -> None:
+		instrumentation = instrumentation if instrumentation is not None else self._instrumentation
+		self._stepper = DijkstraStepper(self, source, destination, instrumentation=instrumentation)
 
 	def dijkstra_step(self, steps=1) -> None:
-		if steps == 0:
-			return
+		self._stepper.step(steps)
 
-		steps -= 1
-		self.dijkstra_step(steps)
+	# Jump forwards or backwards to the state after the given number of steps
+	def dijkstra_seek(self, step: int) -> None:
+		self._stepper.seek(step)
 
-		# Step by step while loop from self.dijkstra
-		if len(self._queue) > 0 and self._done_with_for_loop is True:
-			self._vert = next(iter(self._queue))
-			self._vert_iter = iter(self._vert)
+	# Frozen array-backed copy of the graph, see graphcsr.CompactGraph
+	def compact(self, dtype: Any = None) -> "CompactGraph":
+		from graphcsr import from_graph
+		return from_graph(self) if dtype is None else from_graph(self, dtype)
 
-			self._queue.pop(self._vert)
-			self._done_with_for_loop = False
+	# Distances from every source (all vertices by default) to every vertex, computed by a process pool.
+	# Rows follow the order of sources, columns the iteration order of the graph.
+	def distance_matrix(self, sources: List[Vertex] = None, processes: int = None) -> "np.ndarray":
+		from graphparallel import distance_matrix
+		compact = self.compact()
+		return distance_matrix(compact, self._source_ids(compact, sources), processes)
 
-		# Step by step for loop
-		try:
-			conn = next(self._vert_iter)
-			neighbor, weigh = conn[0], conn[1]
-			vert = self._vert
+	def iter_distances(self, sources: List[Vertex] = None, processes: int = None) -> Iterator[Tuple[Vertex, "np.ndarray"]]:
+		from graphparallel import iter_distances
+		compact = self.compact()
+		for source, row in iter_distances(compact, self._source_ids(compact, sources), processes):
+			yield compact.get_vertex(source), row
 
-			if self._distance_dict[vert] + weigh < self._distance_dict[neighbor]:
-				self._distance_dict[neighbor] = self._distance_dict[vert] + weigh
-				self._queue[neighbor] = self._distance_dict[vert] + weigh
+	def pair_distances(self, pairs: List[Tuple[Vertex, Vertex]], processes: int = None) -> "np.ndarray":
+		from graphparallel import pair_distances
+		compact = self.compact()
+		pairs = [(compact.id_of(source), compact.id_of(destination)) for source, destination in pairs]
+		return pair_distances(compact, pairs, processes)
 
-				self._queue = {k: v for k, v in sorted(self._queue.items(), key=lambda item: item[1])}
-		except StopIteration:
-			self._done_with_for_loop = True
+	# Shortest path tree of a source that follows later changes of the edges, see DynamicShortestPathTree
+	def dynamic_tree(self, source: Vertex) -> "DynamicShortestPathTree":
+		return DynamicShortestPathTree(self, source)
+
+	# Distances from source to every vertex in the iteration order of the graph, the same as dijkstra gives, computed
+	# by graphdelta.DeltaStepping in NumPy rounds. Pays off on large graphs, where it is several times faster.
+	def delta_stepping(self, source: Vertex, delta: float = None, processes: int = 1) -> "np.ndarray":
+		from graphdelta import delta_stepping
+		compact = self.compact()
+		return delta_stepping(compact, compact.id_of(source), delta, processes)
+
+	def _source_ids(self, compact: "CompactGraph", sources: List[Vertex]) -> List[int]:
+		if sources is None:
+			return list(range(len(compact)))
+		return [compact.id_of(source) for source in sources]
+
+	def get_stepper(self) -> DijkstraStepper:
+		return self._stepper
 
 	def get_distance_dict(self) -> Dict[Vertex, float]:
-		return self._distance_dict
+		return self._stepper.get_distance_dict()
 
 	def get_curr_vert(self) -> Vertex:
-		return self._vert
+		return self._stepper.get_curr_vert()
+
+	def get_path(self) -> List[Vertex]:
+		return self._stepper.get_path()
 
 
 class GraphIterator:
 	def __init__(self, graph):
-		self._graph = graph
+		self._vertices = graph._vertices
 		self._index = 0
 
 	def __iter__(self):
 		return self
 
 	def __next__(self):
-		if self._index < len(self._graph):
-			out = self._graph[self._index]
+		# Skip the holes left by removed vertices
+		while self._index < len(self._vertices):
+			out = self._vertices[self._index]
 			self._index += 1
-			return out
+			if out is not None:
+				return out
 
 		raise StopIteration
 
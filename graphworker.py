@@ -0,0 +1,280 @@
+from typing import Dict, List, Optional
+import threading
+import time
+from PySide2 import QtCore
+from graphutils import Graph, Vertex, Instrumentation, DijkstraStepper
+
+
+"""
+State of a background run as sent to the window. Distances and settled vertices are the ones that changed
+since the previous progress, so a widget only updates those. The first progress of a run carries all distances.
+The counters are the Instrumentation counters of the whole run so far.
+"""
+class AlgorithmProgress:
+	def __init__(self, step: int, counters: Dict[str, int], current: Vertex, distances: Dict[Vertex, float],
+				 settled: List[Vertex], path: List[Vertex], done: bool):
+		self._step = step
+		self._counters = counters
+		self._current = current
+		self._distances = distances
+		self._settled = settled
+		self._path = path
+		self._done = done
+
+	def get_step(self) -> int:
+		return self._step
+
+	def get_settled_count(self) -> int:
+		return self._counters["settled"]
+
+	def get_counters(self) -> Dict[str, int]:
+		return self._counters
+
+	def get_current(self) -> Vertex:
+		return self._current
+
+	def get_distances(self) -> Dict[Vertex, float]:
+		return self._distances
+
+	def get_settled(self) -> List[Vertex]:
+		return self._settled
+
+	def get_path(self) -> List[Vertex]:
+		return self._path
+
+	def is_done(self) -> bool:
+		return self._done
+
+
+"""
+Runs the steps of an AlgorithmRunner on a QThreadPool thread, in chunks so cancellation is noticed quickly.
+"""
+class _AlgorithmTask(QtCore.QRunnable):
+	# Steps between two checks of the cancel flag and the clock
+	chunk = 256
+
+	def __init__(self, runner: "AlgorithmRunner", steps: Optional[int]):
+		super().__init__()
+		self.setAutoDelete(False)
+		self._runner = runner
+		self._steps = steps
+		self._returned = False
+
+	def run(self):
+		runner, stepper = self._runner, self._runner.get_stepper()
+		remaining = self._steps
+		last_report = time.perf_counter()
+
+		while not runner.is_cancelled() and (remaining is None or remaining > 0):
+			chunk = _AlgorithmTask.chunk if remaining is None else min(_AlgorithmTask.chunk, remaining)
+			done = stepper.step(chunk)
+			if remaining is not None:
+				remaining -= done
+			if done < chunk:
+				break
+
+			if time.perf_counter() - last_report >= AlgorithmRunner.progress_interval:
+				runner._report(False)
+				last_report = time.perf_counter()
+			# Hand the interpreter lock to the GUI thread, which would otherwise wait for the switch interval
+			time.sleep(0)
+
+		runner._report(True)
+		self._returned = True
+
+	def has_returned(self) -> bool:
+		return self._returned
+
+
+"""
+Step by step Dijkstra run executed off the GUI thread.
+The run works on a GraphSnapshot taken when it is created, so the graph and the view stay editable while it runs,
+and its stepper is only touched by one task at a time. Progress is sent at most every progress_interval seconds
+through the progress signal, the last one of every start() through finished. cancel() stops the task between
+two chunks of steps, finished still reports where it stopped and the run can be started again.
+"""
+class AlgorithmRunner(QtCore.QObject):
+	progress = QtCore.Signal(object)
+	finished = QtCore.Signal(object)
+	# Sent by the task when it is done, handled on the thread of the runner
+	_task_done = QtCore.Signal(object)
+
+	# Seconds between two progress signals, fast enough for an animation without flooding the event loop
+	progress_interval = 0.05
+
+	def __init__(self, graph: Graph, source: Vertex, destination: Vertex, parent: QtCore.QObject = None,
+				 pool: QtCore.QThreadPool = None):
+		super().__init__(parent)
+		self._pool = pool if pool is not None else QtCore.QThreadPool.globalInstance()
+
+		self._instrumentation = Instrumentation(timings=False)
+		self._stepper = DijkstraStepper(graph.snapshot(), source, destination, instrumentation=self._instrumentation)
+
+		self._cancelled = threading.Event()
+		self._running = False
+		self._disposed = False
+		# Tasks are kept until they have returned, a QRunnable must outlive its run()
+		self._tasks = []
+		self._task_done.connect(self._on_task_done)
+
+	def get_stepper(self) -> DijkstraStepper:
+		return self._stepper
+
+	def is_running(self) -> bool:
+		return self._running
+
+	def is_cancelled(self) -> bool:
+		return self._cancelled.is_set()
+
+	# Run the given number of steps in the background, all remaining ones for None. Ignored while a run is going on.
+	def start(self, steps: Optional[int] = None) -> bool:
+		if self._running or self._disposed:
+			return False
+
+		self._tasks = [task for task in self._tasks if not task.has_returned()]
+		self._tasks.append(_AlgorithmTask(self, steps))
+		self._running = True
+		self._pool.start(self._tasks[-1])
+		return True
+
+	def cancel(self) -> None:
+		if self._running:
+			self._cancelled.set()
+
+	# Stop for good and delete the runner once its task has returned, no signal is sent any more
+	def dispose(self) -> None:
+		self._disposed = True
+		self.cancel()
+		if not self._running:
+			self.deleteLater()
+
+	# Wait for the running task to stop, e.g. before the runner is dropped
+	def wait(self, timeout: float = None) -> bool:
+		deadline = time.perf_counter() + timeout if timeout is not None else None
+		while self._running:
+			if deadline is not None and time.perf_counter() > deadline:
+				return False
+			QtCore.QCoreApplication.processEvents()
+			time.sleep(0.001)
+		return True
+
+	# Full state of the run, only safe while no task is running. Later progress only holds the changes made after it.
+	def get_progress(self) -> AlgorithmProgress:
+		stepper = self._stepper
+		stepper.take_changes()
+		return AlgorithmProgress(stepper.get_step(), self._instrumentation.get_counters(),
+								 stepper.get_curr_vert(), dict(stepper.get_distance_dict()), [],
+								 stepper.get_path(), stepper.is_done())
+
+	# Called on the worker thread, the stepper hands its changes over and collects new ones into fresh containers
+	def _report(self, last: bool) -> None:
+		stepper = self._stepper
+		distances, settled = stepper.take_changes()
+
+		progress = AlgorithmProgress(stepper.get_step(), self._instrumentation.get_counters(),
+									 stepper.get_curr_vert(), distances, settled, stepper.get_path(), stepper.is_done())
+		if last:
+			self._task_done.emit(progress)
+		elif not self.is_cancelled():
+			self.progress.emit(progress)
+
+	def _on_task_done(self, progress: AlgorithmProgress) -> None:
+		self._running = False
+		self._cancelled.clear()
+		if self._disposed:
+			self.deleteLater()
+		else:
+			self.finished.emit(progress)
+
+
+"""
+Plays a run back at a given number of steps per second. Every frame starts one batch of steps on the runner and the
+window shows the result once, so a frame costs one repaint however many steps it holds. The batch size is capped by
+the measured speed of the runner so that a batch fits into a frame, and a frame whose batch is still running is
+skipped, so a slow machine plays back slower instead of piling up work. When repainting alone takes longer than
+a frame, batches grow to take as long as the repaint, so at least half of the time still goes to the steps.
+"""
+class AlgorithmPlayer(QtCore.QObject):
+	# Sent once the run is done
+	finished = QtCore.Signal()
+
+	frame_rate = 30
+	# Share of a frame the steps of one batch may take
+	frame_budget = 0.8
+
+	def __init__(self, runner: AlgorithmRunner, speed: float = 1000, parent: QtCore.QObject = None):
+		super().__init__(parent)
+		self._runner = runner
+		self._speed = speed
+		# Steps owed to the playback since the last batch, fractions carry over to the next frame
+		self._credit = 0.0
+		self._last_frame = None
+		# Measured steps per second of the runner, a moving average over the batches
+		self._throughput = 10000.0
+		self._batch_start = None
+		self._batch_steps = 0
+		# Seconds between the end of a batch and the start of the next one, a moving average
+		self._overhead = 0.0
+		self._batch_end = None
+
+		self._timer = QtCore.QTimer(self)
+		self._timer.setInterval(1000 // AlgorithmPlayer.frame_rate)
+		self._timer.timeout.connect(self._frame)
+		runner.finished.connect(self._batch_finished)
+
+	def get_speed(self) -> float:
+		return self._speed
+
+	# Steps per second
+	def set_speed(self, speed: float) -> None:
+		self._speed = speed
+
+	def is_playing(self) -> bool:
+		return self._timer.isActive()
+
+	def play(self) -> None:
+		self._credit = 0.0
+		self._last_frame = time.perf_counter()
+		self._batch_end = None
+		self._timer.start()
+
+	def pause(self) -> None:
+		self._timer.stop()
+
+	# Steps a batch may hold without overrunning the frame
+	def get_batch_limit(self) -> int:
+		seconds = max(AlgorithmPlayer.frame_budget / AlgorithmPlayer.frame_rate, self._overhead)
+		return max(1, int(self._throughput * seconds))
+
+	def _frame(self) -> None:
+		# Steps are owed for the time that passed, so skipped or long frames do not slow the playback down
+		now = time.perf_counter()
+		self._credit += self._speed * (now - self._last_frame)
+		self._last_frame = now
+		if self._runner.is_running():
+			return
+
+		self._credit = min(self._credit, self.get_batch_limit())
+		steps = int(self._credit)
+		if steps == 0:
+			return
+
+		self._credit -= steps
+		self._batch_start = time.perf_counter()
+		if self._batch_end is not None:
+			self._overhead = 0.7 * self._overhead + 0.3 * (self._batch_start - self._batch_end)
+		self._batch_steps = steps
+		self._runner.start(steps)
+
+	def _batch_finished(self, progress: AlgorithmProgress) -> None:
+		if self._batch_start is not None:
+			self._batch_end = time.perf_counter()
+			seconds = self._batch_end - self._batch_start
+			# Batches too short to time are left out of the average
+			if seconds > 0.002:
+				self._throughput = 0.7 * self._throughput + 0.3 * self._batch_steps / seconds
+			self._batch_start = None
+
+		if progress.is_done():
+			self.pause()
+			self.finished.emit()
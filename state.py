@@ -17,14 +17,22 @@ class State(ABC):
 	def step_click(self):
 		pass
 
+	def play_click(self):
+		pass
+
 	def reset_click(self):
 		pass
 
+	# The playback reached the end of the run
+	def play_finished(self):
+		pass
+
 
 class DefaultState(State):
 	def __init__(self):
 		super().__init__()
 		State.window.set_step_button(False)
+		State.window.set_play_button(False)
 		State.window.set_select_button(True)
 
 		self.gw = State.graph_widget
@@ -54,8 +62,11 @@ class DefaultState(State):
 		connect_action.triggered.connect(self.add_connection)
 
 		# If menu is not over any vertex then disable connection
-		if self.gw.childAt(event.pos()).is_empty() is True:
+		if self.gw.vertex_at(event.pos()) is None:
 			connect_action.setDisabled(True)
+		# A vertex can only be added on an empty cell of the grid
+		if self.gw.get_grid_cell(event.pos()) is None or self.gw.vertex_at(event.pos()) is not None:
+			add_action.setDisabled(True)
 
 		self.event = event
 
@@ -68,7 +79,7 @@ class DefaultState(State):
 		self.gw.add_vertex(vert, pos[0], pos[1])
 
 	def add_connection(self):
-		vert = self.gw.childAt(self.event.pos()).get_vertex()
+		vert = self.gw.vertex_at(self.event.pos())
 		if self.connection_source is None:
 			self.connection_source = vert
 		elif self.connection_destination is None and self.connection_source != vert:
@@ -94,24 +105,27 @@ class DefaultState(State):
 
 	def change_connection(self, event):
 		weigh = self.popup.intValue()
-		State.graph_widget.remove_connection(self.source, self.destination)
-		State.graph_widget.add_connection(self.source, self.destination, weigh)
+		State.graph_widget.set_weight(self.source, self.destination, weigh)
 
 
 class SelectSourceState(State):
 	def __init__(self):
 		super().__init__()
 		State.window.set_step_button(False)
+		State.window.set_play_button(False)
 		State.window.set_select_button(False)
 
 		gw = State.graph_widget
-		gw.mouseReleaseEvent = lambda event: self.set_source_vertex(gw.childAt(event.pos()))
+		gw.mouseReleaseEvent = lambda event: self.set_source_vertex(gw.vertex_at(event.pos()))
+
+	def set_source_vertex(self, vertex):
+		if vertex is None:
+			return
 
-	def set_source_vertex(self, vertex_widget):
-		print("selected: " + str(vertex_widget.get_vertex()))
-		vertex_widget.select_animatinon()
+		print("selected: " + str(vertex))
+		State.graph_widget.animate_select(vertex)
 
-		State.window.set_source(vertex_widget.get_vertex())
+		State.window.set_source(vertex)
 		State.window.set_state(SelectDestinationState())
 
 	def reset_click(self):
@@ -123,17 +137,20 @@ class SelectDestinationState(State):
 	def __init__(self):
 		super().__init__()
 		State.window.set_step_button(False)
+		State.window.set_play_button(False)
 		State.window.set_select_button(False)
 
 		gw = State.graph_widget
-		gw.mouseReleaseEvent = lambda event: self.set_destination_vertex(gw.childAt(event.pos()))
+		gw.mouseReleaseEvent = lambda event: self.set_destination_vertex(gw.vertex_at(event.pos()))
+
+	def set_destination_vertex(self, vertex):
+		if vertex is None:
+			return
 
-	def set_destination_vertex(self, vertex_widget):
-		print("selected: " + str(vertex_widget.get_vertex()))
-		vertex_widget.select_animatinon()
+		print("selected: " + str(vertex))
+		State.graph_widget.animate_select(vertex)
 
-		State.window.set_destination(vertex_widget.get_vertex())
-		State.graph_widget.dijkstra_init(State.window.get_source(), vertex_widget)
+		State.window.set_destination(vertex)
 		State.window.set_state(AlgorithmState())
 
 		gw = State.graph_widget
@@ -145,17 +162,48 @@ class SelectDestinationState(State):
 
 
 class AlgorithmState(State):
-	def __init__(self):
+	# restart is False when coming back from PlayState, which keeps the run where the playback stopped
+	def __init__(self, restart: bool = True):
 		super().__init__()
-		State.window.set_step_button(True)
+		if restart:
+			State.window.dijkstra_init()
+
+		done = State.window.is_dijkstra_done()
+		State.window.set_step_button(not done)
+		State.window.set_play_button(not done)
 		State.window.set_select_button(False)
-		State.window.dijkstra_init()
 
+	# The steps run in the background, the widget is updated by the progress they send
 	def step_click(self):
-		State.graph_widget.dijkstra_step()
-		State.graph_widget.update()
-		State.window.update()
+		State.window.dijkstra_step()
+
+	def play_click(self):
+		State.window.set_state(PlayState())
+
+	def reset_click(self):
+		State.window.dijkstra_cancel()
+		State.window.set_state(DefaultState())
+		State.graph_widget.reset()
+
+
+# Steps are played back on a timer until the run is done or Pause is clicked
+class PlayState(State):
+	def __init__(self):
+		super().__init__()
+		State.window.set_step_button(False)
+		State.window.set_play_button(True)
+		State.window.set_select_button(False)
+		State.window.dijkstra_play()
+
+	def play_click(self):
+		State.window.dijkstra_pause()
+		State.window.set_state(AlgorithmState(restart=False))
+
+	def play_finished(self):
+		State.window.dijkstra_pause()
+		State.window.set_state(AlgorithmState(restart=False))
 
 	def reset_click(self):
+		State.window.dijkstra_cancel()
 		State.window.set_state(DefaultState())
 		State.graph_widget.reset()
@@ -2,70 +2,144 @@ from PySide2 import QtWidgets, QtGui, QtCore
 from PySide2.QtCore import QPoint
 from typing import List, Tuple
 from math import atan, sin, cos
+from functools import lru_cache
 
 
 def adjust_line(a: QPoint, b: QPoint, r: int) -> Tuple[QPoint, QPoint]:
-	if a.x() > b.x():
-		a, b = b, a
-	elif a.x() == b.x():
-		if a.y() >= b.y():
-			a, b = b, a
+	x_a, y_a, x_b, y_b = _adjust_coordinates(a.x(), a.y(), b.x(), b.y(), r)
+	return QPoint(x_a, y_a), QPoint(x_b, y_b)
 
-		y_a = a.y() + r + 1
-		y_b = b.y() - r + 1
 
-		return QPoint(a.x() + 1, y_a), QPoint(b.x() + 1, y_b)
+# Trigonometry of adjust_line, cached per edge since the same edges are adjusted on every geometry rebuild
+@lru_cache(maxsize=2 ** 16)
+def _adjust_coordinates(x_a: int, y_a: int, x_b: int, y_b: int, r: int) -> Tuple[int, int, int, int]:
+	if x_a > x_b:
+		x_a, y_a, x_b, y_b = x_b, y_b, x_a, y_a
+	elif x_a == x_b:
+		if y_a >= y_b:
+			y_a, y_b = y_b, y_a
 
-	x_a, y_a = a.x(), a.y()
-	x_b, y_b = b.x(), b.y()
+		return x_a + 1, y_a + r + 1, x_b + 1, y_b - r + 1
 
 	tg = (y_a - y_b) / (x_b - x_a)
 	angle = atan(tg)
 
-	x_a = int(a.x() + r * cos(angle)) + 1
-	y_a = int(a.y() - r * sin(angle)) + 1
+	return (int(x_a + r * cos(angle)) + 1, int(y_a - r * sin(angle)) + 1,
+			int(x_b - r * cos(angle)) + 1, int(y_b + r * sin(angle)) + 1)
+
+
+# Weigh labels shared by every batch. Bounded, graphs loaded from files may have a different weigh on every edge.
+@lru_cache(maxsize=2 ** 12)
+def _weigh_label(text: str) -> QtGui.QStaticText:
+	font = QtGui.QFont()
+	font.setPixelSize(16)
+	label = QtGui.QStaticText(text)
+	label.prepare(font=font)
+	return label
+
+
+"""
+Edges [a, b, weigh, highlighted] prepared for drawing, shared by OverlayWidget and GraphCanvas.
+Both directions of an undirected edge end up as one line. Lines are drawn with one drawLines call per pen
+and the weighs as cached QStaticText, so painting does no per edge formatting or pen changes.
+The drawn batch is kept as a pixmap and repainted only when the device size or the painter transform changes.
+"""
+class EdgeBatch:
+	edge_color = QtGui.QColor(200, 200, 200)
+	path_color = QtGui.QColor(255, 140, 0)
+	text_color = QtGui.QColor(10, 10, 10)
+	# Larger devices are drawn directly instead of through a cached pixmap
+	max_cached_pixels = 2 ** 23
+
+	# Without labels only the lines are drawn, e.g. when the view is zoomed out too far to read them
+	def __init__(self, edges: list, labels: bool = True):
+		self._font = QtGui.QFont()
+		self._font.setPixelSize(16)
+		ascent = QtGui.QFontMetrics(self._font).ascent()
+
+		self._lines = []
+		self._path_lines = []
+		self._labels = []
+		seen = set()
+
+		for edge in edges:
+			a, b = edge[0], edge[1]
+			key = (a.x(), a.y(), b.x(), b.y())
+			if key[2:] + key[:2] in seen:
+				continue
+			seen.add(key)
+
+			x_a, y_a, x_b, y_b = _adjust_coordinates(*key, 10)
+			line = QtCore.QLineF(x_a, y_a, x_b, y_b)
+			# Optional fourth field marks edges of the highlighted path
+			(self._path_lines if len(edge) > 3 and edge[3] else self._lines).append(line)
+
+			if not labels:
+				continue
+
+			# drawText places the baseline at the point, drawStaticText the top left corner
+			center = QtCore.QPointF(int((x_a + x_b) / 2) + 10, int((y_a + y_b) / 2) + 10 - ascent)
+			self._labels.append((center, _weigh_label(str(edge[2]))))
+
+		self._pixmap = None
+		self._pixmap_key = None
+
+	def __len__(self):
+		return len(self._lines) + len(self._path_lines)
+
+	def paint(self, qp: QtGui.QPainter) -> None:
+		device, transform = qp.device(), qp.worldTransform()
+		key = (device.width(), device.height(), device.devicePixelRatioF(), transform)
+		if device.width() * device.height() * key[2] ** 2 > EdgeBatch.max_cached_pixels:
+			self._draw(qp)
+			return
+
+		if self._pixmap is None or self._pixmap_key != key:
+			self._pixmap = QtGui.QPixmap(device.width() * key[2], device.height() * key[2])
+			self._pixmap.setDevicePixelRatio(key[2])
+			self._pixmap.fill(QtCore.Qt.transparent)
+			self._pixmap_key = key
+
+			cache_painter = QtGui.QPainter()
+			cache_painter.begin(self._pixmap)
+			cache_painter.setWorldTransform(transform)
+			self._draw(cache_painter)
+			cache_painter.end()
+
+		qp.save()
+		qp.resetTransform()
+		qp.drawPixmap(0, 0, self._pixmap)
+		qp.restore()
+
+	def _draw(self, qp: QtGui.QPainter) -> None:
+		qpen = QtGui.QPen(EdgeBatch.edge_color)
+		qpen.setWidth(2)
+		qp.setPen(qpen)
+		qp.setFont(self._font)
+		qp.drawLines(self._lines)
 
-	x_b = int(b.x() - r * cos(angle)) + 1
-	y_b = int(b.y() + r * sin(angle)) + 1
+		qpen.setColor(EdgeBatch.path_color)
+		qp.setPen(qpen)
+		qp.drawLines(self._path_lines)
 
-	return QPoint(x_a, y_a), QPoint(x_b, y_b)
+		qpen.setColor(EdgeBatch.text_color)
+		qp.setPen(qpen)
+		for center, label in self._labels:
+			qp.drawStaticText(center, label)
 
 
 class OverlayWidget(QtWidgets.QWidget):
 	def __init__(self, parent, edges: List[QtCore.QPoint], arrows: List[QtCore.QPoint] = []):
 		super().__init__(parent)
 		self._edges = edges
+		self._batch = EdgeBatch(edges)
 		self._arrows = arrows
 
 	def paintEvent(self, event: QtGui.QPaintEvent):
 		qp = QtGui.QPainter()
 		qp.begin(self)
 
-		edge_color = QtGui.QColor(200, 200, 200)
-		text_color = QtGui.QColor(10, 10, 10)
-
-		qpen = QtGui.QPen(edge_color)
-		qpen.setWidth(2)
-		qfont = QtGui.QFont()
-		qfont.setPixelSize(16)
-
-		qp.setPen(qpen)
-		qp.setFont(qfont)
-
-		for edge in self._edges:
-			a = edge[0]
-			b = edge[1]
-
-			qpen.setColor(edge_color)
-			qp.setPen(qpen)
-
-			a, b = adjust_line(a, b, 10)
-			qp.drawLine(a, b)
-
-			qpen.setColor(text_color)
-			qp.setPen(qpen)
-			center = QPoint(int((a.x() + b.x())/2), int((a.y() + b.y())/2))
-			qp.drawText(center + QPoint(10, 10), str(edge[2]))
+		self._batch.paint(qp)
 
 		for arrow in self._arrows:
 			a = arrow[0]
@@ -78,6 +152,7 @@ class OverlayWidget(QtWidgets.QWidget):
 
 	def set_edges(self, edges: list) -> None:
 		self._edges = edges
+		self._batch = EdgeBatch(edges)
 
 	def set_arrows(self, arrows: list) -> None:
 		self._arrows = arrows
@@ -0,0 +1,54 @@
+from typing import Dict, List, Optional
+from graphutils import Vertex
+from graphworker import AlgorithmProgress
+from vertexsystem.vertex import format_distance
+
+
+"""
+Display of an AlgorithmRunner run, shared by GraphWidget and GraphCanvas.
+The renderer keeps its items in _vert_widget_dict {vertex: item with set_text and set_color}, the colors in
+_vertex_color and _settled_color and the highlighted path in _path_edges. It repaints what changed in
+_vertices_changed and _path_changed.
+"""
+class ProgressView:
+	# Restyle the vertices a step changed
+	def show_changes(self, distances: Dict[Vertex, float], settled: List[Vertex]) -> None:
+		# Changed vertices and the longest label they had {vertex: text}
+		dirty = {}
+		for vertex, distance in distances.items():
+			item = self._vert_widget_dict[vertex]
+			text = item.get_text()
+			if item.set_text(format_distance(distance)):
+				# The old label is covered as well, it may be longer than the new one
+				dirty[vertex] = max(text, item.get_text(), key=len)
+		for vertex in settled:
+			if self._vert_widget_dict[vertex].set_color(self._settled_color):
+				dirty.setdefault(vertex, self._vert_widget_dict[vertex].get_text())
+
+		self._vertices_changed(dirty)
+
+	# Show a progress of an AlgorithmRunner, only the vertices it reports as changed are touched
+	def apply_progress(self, progress: AlgorithmProgress) -> None:
+		self.show_changes(progress.get_distances(), progress.get_settled())
+		self.set_path(progress.get_path())
+
+	# Highlight the edges between consecutive vertices of the path
+	def set_path(self, path: List[Vertex]) -> None:
+		path_edges = set(zip(path, path[1:])) | set(zip(path[1:], path))
+		if path_edges != self._path_edges:
+			self._path_edges = path_edges
+			self._path_changed()
+
+	def reset(self) -> None:
+		for key in self._vert_widget_dict:
+			self._vert_widget_dict[key].set_text(str(key))
+			self._vert_widget_dict[key].set_color(self._vertex_color)
+		self.set_path([])
+		self._vertices_changed(None)
+
+	# Repaint the changed vertices {vertex: longest label}, None after every vertex changed
+	def _vertices_changed(self, dirty: Optional[Dict[Vertex, str]]) -> None:
+		raise NotImplementedError
+
+	def _path_changed(self) -> None:
+		raise NotImplementedError
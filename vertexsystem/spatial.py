@@ -0,0 +1,93 @@
+from typing import Any, Dict, Set, Tuple
+import itertools
+
+
+"""
+Uniform grid of square buckets over axis aligned rectangles (x_0, y_0, x_1, y_1).
+Every item is stored in each bucket its rectangle overlaps, so a query only visits the buckets
+under the queried rectangle and its cost depends on what is there, not on the total number of items.
+Items overlapping more than max_buckets buckets, such as very long edges, are kept in one list
+that every query checks instead.
+"""
+class SpatialIndex:
+	def __init__(self, bucket_size: float, max_buckets: int = 64):
+		self._bucket_size = bucket_size
+		self._max_buckets = max_buckets
+		# Items of every non empty bucket {(column, row): {item}}
+		self._buckets = {}
+		self._large = set()
+		# Rectangle of every item {item: (x_0, y_0, x_1, y_1)}
+		self._rects = {}
+
+	def __len__(self):
+		return len(self._rects)
+
+	def __contains__(self, item):
+		return item in self._rects
+
+	def _bucket_range(self, rect: Tuple[float, float, float, float]) -> Tuple[int, int, int, int]:
+		size = self._bucket_size
+		return int(rect[0] // size), int(rect[1] // size), int(rect[2] // size), int(rect[3] // size)
+
+	def insert(self, item: Any, rect: Tuple[float, float, float, float]) -> None:
+		if item in self._rects:
+			self.remove(item)
+
+		# Rectangles may be given with their corners in any order
+		rect = (min(rect[0], rect[2]), min(rect[1], rect[3]), max(rect[0], rect[2]), max(rect[1], rect[3]))
+		self._rects[item] = rect
+		column_0, row_0, column_1, row_1 = self._bucket_range(rect)
+		if (column_1 - column_0 + 1) * (row_1 - row_0 + 1) > self._max_buckets:
+			self._large.add(item)
+			return
+
+		for column in range(column_0, column_1 + 1):
+			for row in range(row_0, row_1 + 1):
+				self._buckets.setdefault((column, row), set()).add(item)
+
+	def remove(self, item: Any) -> None:
+		column_0, row_0, column_1, row_1 = self._bucket_range(self._rects.pop(item))
+		if item in self._large:
+			self._large.discard(item)
+			return
+
+		for column in range(column_0, column_1 + 1):
+			for row in range(row_0, row_1 + 1):
+				bucket = self._buckets[(column, row)]
+				bucket.discard(item)
+				if not bucket:
+					del self._buckets[(column, row)]
+
+	def clear(self) -> None:
+		self._buckets.clear()
+		self._large.clear()
+		self._rects.clear()
+
+	# Items whose rectangle intersects the given one
+	def query(self, rect: Tuple[float, float, float, float]) -> Set[Any]:
+		x_0, y_0, x_1, y_1 = rect
+		column_0, row_0, column_1, row_1 = self._bucket_range(rect)
+		found = set()
+
+		# Walk whichever is smaller, the buckets under the rectangle or the non empty buckets
+		if (column_1 - column_0 + 1) * (row_1 - row_0 + 1) <= len(self._buckets):
+			keys = ((column, row) for column in range(column_0, column_1 + 1) for row in range(row_0, row_1 + 1))
+		else:
+			keys = [key for key in self._buckets if column_0 <= key[0] <= column_1 and row_0 <= key[1] <= row_1]
+
+		for items in itertools.chain((self._buckets.get(key, ()) for key in keys), (self._large,)):
+			for item in items:
+				if item in found:
+					continue
+
+				item_rect = self._rects[item]
+				if item_rect[0] <= x_1 and x_0 <= item_rect[2] and item_rect[1] <= y_1 and y_0 <= item_rect[3]:
+					found.add(item)
+
+		return found
+
+	def query_point(self, x: float, y: float) -> Set[Any]:
+		return self.query((x, y, x, y))
+
+	def get_rects(self) -> Dict[Any, Tuple[float, float, float, float]]:
+		return self._rects
@@ -1,8 +1,17 @@
 from PySide2 import QtWidgets, QtGui, QtCore
 from PySide2.QtCore import QPoint
+from typing import Tuple
+import functools
 from graphutils import Vertex
 
 
+# Label text of a distance. The same few values are shown over and over, so their strings are made once.
+# Typed, so that 1 and 1.0 keep their own text.
+@functools.lru_cache(maxsize=4096, typed=True)
+def format_distance(distance: float) -> str:
+	return str(distance)
+
+
 class VertexWidget(QtWidgets.QLabel):
 	vertex_size = 20
 
@@ -55,28 +64,29 @@ class VertexWidget(QtWidgets.QLabel):
 
 		self.update_position()
 
-	def set_color(self, color: QtGui.QColor) -> None:
-		self._color = color
+	# Setters only repaint this widget, and only when the value changed. They return whether it changed.
+	def set_color(self, color: QtGui.QColor) -> bool:
+		changed = color is not self._color
+		if changed:
+			self._color = color
+			self.update()
+		return changed
 
 	# Set text label inside the vertex
-	def set_text(self, text: str) -> None:
-		self._text = text
-
-	# Setting QPoint position of the widget based on position in grid layout
-	def update_position(self) -> None:
-		curr_drag_widget = self.parent()
-
-		grid_layout = DragAndDropWidget.grid_layout
-		index = grid_layout.indexOf(curr_drag_widget)
-		pos = grid_layout.getItemPosition(index)
+	def set_text(self, text: str) -> bool:
+		changed = text != self._text
+		if changed:
+			self._text = text
+			self.update()
+		return changed
 
-		w_coeff = grid_layout.totalMinimumSize().width() / grid_layout.columnCount()
-		h_coeff = grid_layout.totalMinimumSize().height() / grid_layout.rowCount()
+	def get_text(self) -> str:
+		return self._text
 
-		qpoint = QPoint(pos[1] * w_coeff, pos[0] * h_coeff)
-		qpoint += QPoint(DragAndDropWidget.dag_size / 2, DragAndDropWidget.dag_size / 2)
-
-		self._position = qpoint
+	# Setting QPoint position of the widget based on the grid cell of its DragAndDropWidget
+	def update_position(self) -> None:
+		drag_widget = self.get_drag_and_drop()
+		self._position = drag_widget.parentWidget().get_cell_center(drag_widget.get_cell())
 
 	def get_postition(self) -> QtCore.QPoint:
 		return self._position
@@ -101,7 +111,7 @@ class VertexWidget(QtWidgets.QLabel):
 Widget to animate circle select on VertexWidget inside DragAnDropWidget
 """
 class SelectCircleWidget(QtWidgets.QLabel):
-	def __init__(self, parent, controller: "DragAndDropWidget"):
+	def __init__(self, parent, controller: "SelectAnimation"):
 		super().__init__(parent)
 
 		self._pixmap = QtGui.QPixmap('images/circle_select.png')
@@ -128,6 +138,32 @@ class SelectCircleWidget(QtWidgets.QLabel):
 	scale = QtCore.Property(float, get_scale, set_scale)
 
 
+"""
+Shrinking circle around a point of the parent widget, shown when a vertex is selected.
+"""
+class SelectAnimation:
+	def __init__(self, parent: QtWidgets.QWidget, center: QPoint):
+		self._center = center
+		self._label = SelectCircleWidget(parent, self)
+
+		self.position_label()
+		self._label.show()
+
+		self.anim = QtCore.QPropertyAnimation(self._label, b"scale")
+		self.anim.setDuration(500)
+		self.anim.setStartValue(1)
+		self.anim.setEndValue(0.1)
+		self.anim.start()
+
+		QtCore.QObject.connect(self.anim, QtCore.SIGNAL('finished()'), self._label, QtCore.SLOT('deleteLater()'))
+
+	def position_label(self) -> None:
+		pixmap = self._label.get_pixmap()
+		width, height = pixmap.width(), pixmap.height()
+		self._label.move(self._center - QPoint(int(width / 2), int(height / 2)))
+		self._label.resize(width, height)
+
+
 """
 Widget contains exactly one VertexWidget.
 The VertexWidget object can be replaced (by dragging) between two DragAndDropWidgets
@@ -137,8 +173,10 @@ class DragAndDropWidget(QtWidgets.QWidget):
 	dag_size = VertexWidget.vertex_size + margin
 	grid_layout = None
 
-	def __init__(self, parent, vertex_widget: VertexWidget = None):
+	def __init__(self, parent, vertex_widget: VertexWidget = None, cell: Tuple[int, int] = None):
 		super().__init__(parent)
+		# Grid cell (row, column) of the widget, fixed for its lifetime
+		self._cell = cell
 		self.setAcceptDrops(True)
 		self._content_layout = QtWidgets.QVBoxLayout(self)
 		self._content_layout.setAlignment(QtCore.Qt.AlignCenter)
@@ -155,7 +193,7 @@ class DragAndDropWidget(QtWidgets.QWidget):
 		self.setFixedSize(size, size)
 
 		DragAndDropWidget.grid_layout = parent.layout()
-		self._label = None
+		self._animation = None
 
 	def dragEnterEvent(self, event):
 		if event.mimeData().hasText():
@@ -176,6 +214,7 @@ class DragAndDropWidget(QtWidgets.QWidget):
 				self._vertex_widget.setParent(self)
 
 				vertex_source.clear()
+				self.parentWidget().vertex_moved(vertex_source.get_vertex(), self._cell)
 			else:
 				event.ignore()
 		else:
@@ -212,28 +251,12 @@ class DragAndDropWidget(QtWidgets.QWidget):
 	def get_vertex_widget(self) -> VertexWidget:
 		return self._vertex_widget
 
-	def animate_circle(self) -> None:
-		parent = self.parentWidget()
-		self._label = SelectCircleWidget(parent, self)
-
-		self.position_label()
-		self._label.show()
-
-		self.anim = QtCore.QPropertyAnimation(self._label, b"scale")
-		self.anim.setDuration(500)
-		self.anim.setStartValue(1)
-		self.anim.setEndValue(0.1)
-		self.anim.start()
-
-		QtCore.QObject.connect(self.anim, QtCore.SIGNAL('finished()'), self._label, QtCore.SLOT('deleteLater()'))
+	def get_cell(self) -> Tuple[int, int]:
+		return self._cell
 
-	def position_label(self) -> None:
-		pixmap = self._label.get_pixmap()
-		width, height = pixmap.width(), pixmap.height()
-		position = self.pos() + QPoint(int(self.size().width() / 2), int(self.size().height() / 2))
-		position -= QPoint(int(width / 2), int(height / 2))
-		self._label.move(position)
-		self._label.resize(width, height)
+	def animate_circle(self) -> None:
+		center = self.pos() + QPoint(int(self.size().width() / 2), int(self.size().height() / 2))
+		self._animation = SelectAnimation(self.parentWidget(), center)
 
 	def is_empty(self):
 		return self._vertex_widget.is_empty()